@@ -0,0 +1,254 @@
+# async_training.py
+#
+# Asynchronous multi-process Q-learning. One dense Q-table lives in
+# multiprocessing.shared_memory; each worker process runs its own
+# Environment and Agent (with its own exploration rate) and reads and
+# updates that table in place, without copying it. Updates are either
+# lock-free (Hogwild: occasional lost updates are tolerated) or guarded by
+# striped locks, where state s is protected by lock s % stripes.
+#
+# Usage:
+#   python async_training.py --state S5 --reward R1 --workers 8 --episodes 20000
+#   python async_training.py --state S4 --reward R2 --workers 8 --episodes 20000 --lock-stripes 64
+
+import argparse
+import multiprocessing
+import os
+import queue
+import random
+import time
+import zlib
+from multiprocessing import shared_memory
+import numpy as np
+from settings import (
+    ACTIONS, STATE_SPACES, REWARD_SETTINGS, NUM_EPISODES, MIN_EXPLORATION_RATE
+)
+from environment import Environment
+from agent import Agent
+from qtable import DenseQTable, dense_layout
+
+
+class SharedDenseQTable(DenseQTable):
+    """
+    DenseQTable whose arrays live in shared memory. Rows of unseen states
+    are already zero there, so assigning a row (what the agents do to
+    initialise an unseen state) only marks it visited; writing the zeros
+    could wipe an update another worker made in the meantime.
+    """
+
+    def __setitem__(self, state, row):
+        self.visited[state] = True
+
+
+class SharedQTable:
+    def __init__(self, layout, names=None):
+        """
+        Creates the shared Q-table for `layout`, or attaches to an existing
+        one when `names` (the .names of the creating SharedQTable) is given.
+        """
+        self.layout = layout
+        num_values = layout.size * len(ACTIONS)
+        if names is None:
+            self._values_shm = shared_memory.SharedMemory(create=True, size=num_values * 4)
+            self._visited_shm = shared_memory.SharedMemory(create=True, size=layout.size)
+            self.owner = True
+        else:
+            self._values_shm = shared_memory.SharedMemory(name=names[0])
+            self._visited_shm = shared_memory.SharedMemory(name=names[1])
+            self.owner = False
+        values = np.ndarray((layout.size, len(ACTIONS)), dtype=np.float32, buffer=self._values_shm.buf)
+        visited = np.ndarray(layout.size, dtype=bool, buffer=self._visited_shm.buf)
+        if self.owner:
+            values[:] = 0.0
+            visited[:] = False
+        self.table = SharedDenseQTable(layout, values, visited)
+
+    @property
+    def names(self):
+        return self._values_shm.name, self._visited_shm.name
+
+    def copy(self):
+        """A private DenseQTable with the current values (e.g. to save)."""
+        return DenseQTable(self.layout, self.table.values.copy(), self.table.visited.copy())
+
+    def close(self):
+        """Detaches; the creating process also frees the memory."""
+        self.table = None
+        self._values_shm.close()
+        self._visited_shm.close()
+        if self.owner:
+            self._values_shm.unlink()
+            self._visited_shm.unlink()
+
+
+def worker_seed(base_seed, worker_id):
+    """Deterministic per-worker seed."""
+    return zlib.crc32(f"{base_seed}_worker{worker_id}".encode())
+
+
+def exploration_floors(workers):
+    """
+    Default per-worker exploration floors, spread geometrically from
+    MIN_EXPLORATION_RATE to 0.1 so some workers keep exploring while
+    others mostly exploit the shared table.
+    """
+    if workers == 1:
+        return [MIN_EXPLORATION_RATE]
+    return list(np.geomspace(MIN_EXPLORATION_RATE, 0.1, workers))
+
+
+def collect_results(results, processes, poll_seconds=1.0):
+    """
+    Gets one result per process from the `results` queue. Raises
+    RuntimeError instead of waiting forever when a process exits with a
+    non-zero code (e.g. an exception) or all exit without reporting.
+    """
+    collected = []
+    while len(collected) < len(processes):
+        try:
+            collected.append(results.get(timeout=poll_seconds))
+            continue
+        except queue.Empty:
+            pass
+        for process in processes:
+            if process.exitcode not in (None, 0):
+                raise RuntimeError(f"{process.name} exited with code {process.exitcode}")
+        if all(process.exitcode is not None for process in processes):
+            raise RuntimeError(f"{len(processes) - len(collected)} process(es) exited without a result")
+    return collected
+
+
+def _worker(worker_id, state_space, rewards, num_episodes, exploration_floor, seed,
+            table_names, locks, results):
+    """Worker process: trains on the shared table and reports its curves."""
+    random.seed(seed)
+    np.random.seed(seed)
+    shared = SharedQTable(dense_layout(state_space), table_names)
+    agent = Agent(state_space=state_space, dense=True)
+    agent.q_table = shared.table
+    env = Environment(rewards=rewards)
+
+    get_state, choose_action, learn = agent.get_state, agent.choose_action, agent.learn
+    if locks:
+        stripes = len(locks)
+        agent_learn = agent.learn
+
+        def learn(state, action, reward, next_state, done):
+            with locks[state % stripes]:
+                agent_learn(state, action, reward, next_state, done)
+
+    total_rewards, lengths = [], []
+    total_steps = 0
+    started = time.time()
+    for _ in range(num_episodes):
+        env.reset()
+        state = get_state(env.snake, env.food)
+        done = False
+        episode_reward = 0
+        while not done:
+            action = choose_action(state)
+            reward, done = env.step(action)
+            next_state = get_state(env.snake, env.food)
+            learn(state, action, reward, next_state, done)
+            state = next_state
+            episode_reward += reward
+            total_steps += 1
+        agent.update_exploration_rate()
+        agent.exploration_rate = max(agent.exploration_rate, exploration_floor)
+        total_rewards.append(episode_reward)
+        lengths.append(env.snake.length)
+
+    finished = time.time()
+
+    agent.q_table = None
+    shared.close()
+    results.put((worker_id, total_rewards, lengths, total_steps, started, finished))
+
+
+def run_async(state_space, rewards, num_episodes=NUM_EPISODES, workers=None, lock_stripes=0,
+              floors=None, seed=0):
+    """
+    Trains one Q-table with `workers` asynchronous processes.
+
+    Args:
+        state_space: A dense state space (S1, S2, S4 or S5).
+        num_episodes (int): Episodes in total, split evenly over the workers.
+        workers (int): Worker processes; None uses os.cpu_count().
+        lock_stripes (int): 0 for lock-free (Hogwild) updates, otherwise the
+            number of striped locks guarding the updates.
+        floors (list): Per-worker exploration floors; every worker starts at
+            EXPLORATION_RATE and decays as usual down to its floor
+            (default: exploration_floors(workers)).
+        seed (int): Base seed; each worker derives its own from it. The
+            interleaving of updates is up to the OS, so runs are not
+            bit-reproducible.
+
+    Returns:
+        tuple: (total_rewards, lengths, agent, steps_per_second); the
+        curves are concatenated in worker order and the agent holds a
+        private copy of the final table.
+    """
+    workers = workers or os.cpu_count()
+    floors = floors or exploration_floors(workers)
+    layout = dense_layout(state_space)
+    ctx = multiprocessing.get_context('spawn')
+    locks = [ctx.Lock() for _ in range(lock_stripes)]
+    results = ctx.Queue()
+    shared = SharedQTable(layout)
+
+    processes = []
+    try:
+        for worker_id in range(workers):
+            episodes = num_episodes // workers + (worker_id < num_episodes % workers)
+            process = ctx.Process(target=_worker, daemon=True, args=(
+                worker_id, state_space, rewards, episodes, floors[worker_id],
+                worker_seed(seed, worker_id), shared.names, locks, results))
+            processes.append(process)
+
+        for process in processes:
+            process.start()
+        # Drain the queue before joining, or a worker can block on put()
+        finished = sorted(collect_results(results, processes))
+        for process in processes:
+            process.join()
+
+        agent = Agent(state_space=state_space, exploration_rate=min(floors), dense=True)
+        agent.q_table = shared.copy()
+    finally:
+        # After a failure the other workers would keep writing to freed memory
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        shared.close()
+
+    total_rewards = [r for _, worker_rewards, *_ in finished for r in worker_rewards]
+    lengths = [l for _, _, worker_lengths, *_ in finished for l in worker_lengths]
+    # Training time only (from the first worker starting to the last one
+    # finishing), so process start-up does not dilute the rate
+    elapsed = max(f[5] for f in finished) - min(f[4] for f in finished)
+    steps_per_second = sum(f[3] for f in finished) / elapsed
+    return total_rewards, lengths, agent, steps_per_second
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Asynchronous Q-learning on a shared-memory Q-table.")
+    parser.add_argument('--state', default='S5', choices=['S1', 'S2', 'S4', 'S5'])
+    parser.add_argument('--reward', default='R1', choices=list(REWARD_SETTINGS))
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores)")
+    parser.add_argument('--episodes', type=int, default=NUM_EPISODES, help="Episodes over all workers")
+    parser.add_argument('--lock-stripes', type=int, default=0, help="Striped locks (0 = lock-free Hogwild)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None,
+                        help="Q-table file (default: q_tables_async/q_table_<state>_<reward>.pkl)")
+    args = parser.parse_args()
+
+    total_rewards, lengths, agent, steps_per_second = run_async(
+        STATE_SPACES[args.state], REWARD_SETTINGS[args.reward], args.episodes, args.workers,
+        args.lock_stripes, seed=args.seed)
+    output = args.output or os.path.join("q_tables_async", f"q_table_{args.state}_{args.reward}.pkl")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    agent.save_q_table(output)
+    window = total_rewards[-100:]
+    print(f"{len(total_rewards)} episodes at {steps_per_second:,.0f} steps/s; "
+          f"mean reward of the last {len(window)}: {np.mean(window):.2f}; saved to {output}")
@@ -0,0 +1,395 @@
+# benchmark.py
+#
+# Throughput benchmarks for the training hot path: Environment.step, the
+# state encoders, Agent.learn / SarsaAgent.sarsa_update and the full
+# run_experiment / run_experiment_sarsa loops, at several snake lengths and
+# grid sizes. Results are ops/second and are compared against a committed
+# baseline (benchmark_baseline.json) to catch slowdowns.
+#
+# Single timings on a shared machine easily vary by 2x, so every benchmark
+# keeps the best of --repeat timed calls, and a comparison with the baseline
+# is refused when --min-time is shorter than MIN_COMPARE_TIME or than the
+# baseline's own min_time.
+#
+# Each grid size runs in a fresh process that patches settings.GRID_WIDTH /
+# GRID_HEIGHT before the game modules are imported, since those modules read
+# the grid size (and build lookup tables from it) at import time.
+#
+# Usage:
+#   python -m benchmark                          # run and compare with the baseline
+#   python -m benchmark --output results.json --repeat 9
+#   python -m benchmark --update-baseline        # rewrite benchmark_baseline.json
+#   python -m benchmark --grids 30x30 --lengths 3,50 --filter encode --threshold 0.3
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import time
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_baseline.json")
+DEFAULT_GRIDS = "10x10,30x30,60x60"
+DEFAULT_LENGTHS = "3,30,150"
+LOOP_EPISODES = 300
+DEFAULT_REPEAT = 5
+MIN_COMPARE_TIME = 0.2
+
+
+# -----------------------------
+# Timing
+# -----------------------------
+def measure(run, min_time, repeat=DEFAULT_REPEAT):
+    """
+    Calls run(n) with n grown until one call takes at least `min_time`
+    seconds, then repeats that call and keeps the best rate.
+
+    Returns:
+        float: Operations per second (n / elapsed).
+    """
+    n = 1
+    while True:
+        start = time.perf_counter()
+        run(n)
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            break
+        n = max(n * 2, int(n * min_time / max(elapsed, 1e-9) * 1.2))
+    best = n / elapsed
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        run(n)
+        best = max(best, n / (time.perf_counter() - start))
+    return best
+
+
+# -----------------------------
+# Fixtures (imported lazily, inside the per-grid process)
+# -----------------------------
+def hamiltonian_cycle(width, height):
+    """
+    Cells of a cycle visiting every cell once: right along row 0, serpentine
+    down through columns 1..width-1, then back up column 0. Needs an even
+    height.
+    """
+    cycle = [(x, 0) for x in range(width)]
+    for y in range(1, height):
+        xs = range(width - 1, 0, -1) if y % 2 else range(1, width)
+        cycle.extend((x, y) for x in xs)
+    cycle.extend((0, y) for y in range(height - 1, 0, -1))
+    return cycle
+
+
+def _direction(a, b):
+    dx, dy = b[0] - a[0], b[1] - a[1]
+    return {(0, -1): 'UP', (0, 1): 'DOWN', (-1, 0): 'LEFT', (1, 0): 'RIGHT'}[(dx, dy)]
+
+
+class CycleCourse:
+    def __init__(self, width, height):
+        """
+        Snakes of a fixed length laid along a Hamiltonian cycle, plus the
+        action that keeps a head on the cycle, so env.step can be timed at a
+        given length without the snake dying.
+        """
+        from environment import Snake
+        self.Snake = Snake
+        self.cycle = hamiltonian_cycle(width, height)
+        n = len(self.cycle)
+        turn_left = {'UP': 'LEFT', 'LEFT': 'DOWN', 'DOWN': 'RIGHT', 'RIGHT': 'UP'}
+        self.actions = {}
+        for i, cell in enumerate(self.cycle):
+            current = _direction(self.cycle[i - 1], cell)
+            wanted = _direction(cell, self.cycle[(i + 1) % n])
+            if wanted == current:
+                self.actions[cell] = 'STRAIGHT'
+            elif wanted == turn_left[current]:
+                self.actions[cell] = 'LEFT'
+            else:
+                self.actions[cell] = 'RIGHT'
+
+    def snake(self, length, head_pos=0):
+        """A Snake of `length` whose head is cycle[head_pos], body behind it."""
+        from collections import deque
+        from environment import Occupancy
+        n = len(self.cycle)
+        snake = self.Snake()
+        snake.body = deque(self.cycle[(head_pos - k) % n] for k in range(length))
+        snake.occupancy = Occupancy()
+        for x, y in snake.body:
+            snake.occupancy.add(x, y)
+        snake.direction = _direction(self.cycle[(head_pos - 1) % n], self.cycle[head_pos % n])
+        return snake
+
+    def environment(self, rewards, length, head_pos=0):
+        from environment import Environment
+        env = Environment(rewards=rewards)
+        env.snake = self.snake(length, head_pos)
+        env.spawn_food()
+        return env
+
+
+def snapshots(course, length, count=32):
+    """(snake, food) pairs at `length`, spread around the cycle."""
+    from environment import Food
+    pairs = []
+    step = max(1, len(course.cycle) // count)
+    for k in range(count):
+        snake = course.snake(length, k * step)
+        pairs.append((snake, Food(snake.occupancy.random_free_cell())))
+    return pairs
+
+
+# -----------------------------
+# Benchmarks
+# -----------------------------
+def bench_env_step(course, length, min_time, repeat):
+    from settings import REWARD_SETTINGS
+    env = course.environment(REWARD_SETTINGS["R1"], length)
+    actions = course.actions
+    limit = length + max(4, length // 10)
+
+    def run(n):
+        for _ in range(n):
+            env.step(actions[env.snake.head])
+            if env.snake.length > limit:
+                env.snake = course.snake(length, course.cycle.index(env.snake.head))
+    return measure(run, min_time, repeat)
+
+
+def bench_encoder(encode, pairs, min_time, repeat):
+    count = len(pairs)
+
+    def run(n):
+        for i in range(n):
+            snake, food = pairs[i % count]
+            encode(snake, food)
+    return measure(run, min_time, repeat)
+
+
+def bench_update(update, transitions, min_time, repeat):
+    count = len(transitions)
+
+    def run(n):
+        for i in range(n):
+            update(*transitions[i % count])
+    return measure(run, min_time, repeat)
+
+
+def bench_loop(module_name, run_name, state_name, min_time, repeat):
+    """
+    Steps/second of a full training loop (best of at least `repeat` runs).
+    The module's Environment is swapped for a subclass that counts steps for
+    the duration of the run.
+    """
+    import importlib
+    from settings import STATE_SPACES, REWARD_SETTINGS
+    module = importlib.import_module(module_name)
+    base = module.Environment
+    steps = [0]
+
+    class CountingEnvironment(base):
+        __slots__ = ()
+
+        def step(self, action):
+            steps[0] += 1
+            return base.step(self, action)
+
+    module.Environment = CountingEnvironment
+    try:
+        random.seed(0)
+        best = 0.0
+        deadline = time.perf_counter() + min_time
+        for run in itertools.count(1):
+            steps[0] = 0
+            start = time.perf_counter()
+            getattr(module, run_name)(STATE_SPACES[state_name], REWARD_SETTINGS["R1"],
+                                      num_episodes=LOOP_EPISODES, show_game=False)
+            best = max(best, steps[0] / (time.perf_counter() - start))
+            if run >= repeat and time.perf_counter() >= deadline:
+                return best
+    finally:
+        module.Environment = base
+
+
+def _run_grid(width, height, lengths, min_time, pattern, repeat):
+    """Runs every benchmark for one grid size. Executed in a fresh process."""
+    import settings
+    settings.GRID_WIDTH, settings.GRID_HEIGHT = width, height
+    from settings import ACTIONS, STATE_SPACES
+    from features import ENCODERS
+    from agent import Agent
+    from sarsa_agent import SarsaAgent
+
+    grid = f"{width}x{height}"
+    results = {}
+
+    def record(name, run):
+        key = f"{name}[{grid}]"
+        if pattern and pattern not in key:
+            return
+        results[key] = run()
+        print(f"  {key:<48} {results[key]:>14,.0f} /s", flush=True)
+
+    random.seed(0)
+    course = CycleCourse(width, height)
+    cells = width * height
+    for length in lengths:
+        if length >= cells:
+            continue
+        record(f"env.step/len={length}", lambda: bench_env_step(course, length, min_time, repeat))
+        pairs = snapshots(course, length)
+        for state_name, state_space in STATE_SPACES.items():
+            encode = ENCODERS[tuple(state_space)]
+            record(f"encode_{state_name.lower()}/len={length}",
+                   lambda: bench_encoder(encode, pairs, min_time, repeat))
+
+    pairs = snapshots(course, min(lengths[0], cells - 1), count=256)
+    for state_name, dense in (("S3", False), ("S5", False), ("S5", True)):
+        kind = "dense" if dense else "dict"
+        for cls, method in ((Agent, "learn"), (SarsaAgent, "sarsa_update")):
+            agent = cls(STATE_SPACES[state_name], dense=dense)
+            states = [agent.get_state(snake, food) for snake, food in pairs]
+            if method == "learn":
+                transitions = [(states[i], random.choice(ACTIONS), -1.0, states[i + 1], False)
+                               for i in range(len(states) - 1)]
+            else:
+                transitions = [(states[i], random.choice(ACTIONS), -1.0, states[i + 1],
+                                random.choice(ACTIONS)) for i in range(len(states) - 1)]
+            record(f"{cls.__name__}.{method}/{state_name}-{kind}",
+                   lambda: bench_update(getattr(agent, method), transitions, min_time, repeat))
+
+    for state_name in ("S1", "S5"):
+        record(f"run_experiment/{state_name}",
+               lambda: bench_loop("experiments", "run_experiment", state_name, min_time, repeat))
+        record(f"run_experiment_sarsa/{state_name}",
+               lambda: bench_loop("experiments_sarsa", "run_experiment_sarsa", state_name, min_time, repeat))
+    return results
+
+
+def run_benchmarks(grids, lengths, min_time=0.2, pattern=None, repeat=DEFAULT_REPEAT):
+    """
+    Args:
+        grids (list): (width, height) pairs; heights must be even.
+        lengths (list): Snake lengths for the env.step and encoder benchmarks.
+        min_time (float): Minimum seconds per timed call.
+        pattern (str): Only run benchmarks whose name contains this substring.
+        repeat (int): Timed calls per benchmark; the best rate is kept.
+
+    Returns:
+        dict: {benchmark name: ops per second}
+    """
+    results = {}
+    ctx = multiprocessing.get_context("spawn")
+    for width, height in grids:
+        if height % 2:
+            raise ValueError(f"Grid height must be even for the cycle course: {width}x{height}")
+        print(f"=== Grid {width}x{height} ===", flush=True)
+        with ctx.Pool(1) as pool:
+            results.update(pool.apply(_run_grid, (width, height, lengths, min_time, pattern, repeat)))
+    return results
+
+
+def machine_info():
+    import numpy as np
+    return {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor() or platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints current vs baseline rates.
+
+    Returns:
+        list: Names of benchmarks slower than baseline * (1 - threshold).
+    """
+    regressions = []
+    print(f"\n{'benchmark':<48} {'baseline':>12} {'current':>12} {'ratio':>7}")
+    for name, rate in results.items():
+        if name not in baseline:
+            print(f"{name:<48} {'-':>12} {rate:>12,.0f} {'new':>7}")
+            continue
+        ratio = rate / baseline[name]
+        flag = ""
+        if ratio < 1.0 - threshold:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<48} {baseline[name]:>12,.0f} {rate:>12,.0f} {ratio:>6.2f}x{flag}")
+    return regressions
+
+
+def _parse_grids(text):
+    return [tuple(int(v) for v in g.lower().split("x")) for g in text.split(",") if g]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the training hot path.")
+    parser.add_argument('--grids', default=DEFAULT_GRIDS, help="Comma-separated WxH grid sizes")
+    parser.add_argument('--lengths', default=DEFAULT_LENGTHS, help="Comma-separated snake lengths")
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help=f"Minimum seconds per timed call (at least {MIN_COMPARE_TIME} to compare)")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT,
+                        help="Timed calls per benchmark; the best rate is kept")
+    parser.add_argument('--filter', default=None, help="Only run benchmarks whose name contains this")
+    parser.add_argument('--output', default=None, help="Write results JSON here")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="Baseline JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help="Allowed slowdown as a fraction of the baseline rate (default 0.2)")
+    parser.add_argument('--update-baseline', action='store_true', help="Write the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if not args.update_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        required = max(MIN_COMPARE_TIME, baseline.get("min_time", 0))
+        if args.min_time < required:
+            parser.error(f"--min-time {args.min_time} is too short to compare with the baseline "
+                         f"(need at least {required}); pass --baseline '' to skip the comparison")
+
+    lengths = [int(v) for v in args.lengths.split(",") if v]
+    results = run_benchmarks(_parse_grids(args.grids), lengths, args.min_time, args.filter, args.repeat)
+    report = {"machine": machine_info(), "min_time": args.min_time, "repeat": args.repeat,
+              "results": results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if args.update_baseline:
+        baseline = {"results": {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        baseline["machine"] = report["machine"]
+        baseline["min_time"] = args.min_time
+        baseline["repeat"] = args.repeat
+        baseline["results"].update(results)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+        print(f"Baseline updated: {args.baseline}")
+        return 0
+
+    if baseline is None:
+        print(f"No baseline at {args.baseline!r}; run with --update-baseline to create one.")
+        return 0
+    regressions = compare(results, baseline["results"], args.threshold)
+    if regressions:
+        print(f"\n{len(regressions)} benchmark(s) slower than the baseline by more than "
+              f"{args.threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\nNo regressions.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,168 @@
+# checkpoint.py
+#
+# Periodic checkpoints for the training loops, so a crash late in a run does
+# not lose it. A checkpoint is taken at an episode boundary and holds
+# everything the rest of the run depends on:
+#   Q-table, exploration rate, last finished episode, the global `random`
+#   and NumPy RNG states (and the environment's own RNG if it is seeded),
+#   the reward/length curves so far, the byte offset of the metrics file and,
+#   when the loop replays experience, the replay buffer.
+# Resuming from it therefore gives exactly the same results as a run that
+# was never interrupted.
+#
+# The state is copied on the training thread (cheap), then pickled and
+# written by a background thread to <path>.tmp and moved over <path> with
+# os.replace, so a checkpoint file is always complete.
+
+import os
+import pickle
+import random
+import threading
+import time
+import numpy as np
+from qtable import DenseQTable
+
+CHECKPOINT_VERSION = 1
+
+
+def checkpoint_path(q_table_path):
+    """Where the checkpoint of a run goes: next to its Q-table."""
+    return os.path.splitext(q_table_path)[0] + ".ckpt"
+
+
+def _copy_q_table(q_table):
+    if isinstance(q_table, DenseQTable):
+        return DenseQTable(q_table.layout, q_table.values.copy(), q_table.visited.copy())
+    return {state: np.array(q_values, copy=True) for state, q_values in q_table.items()}
+
+
+def write_atomic(path, obj):
+    """Pickles `obj` straight into <path>.tmp, then moves it over `path`."""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path):
+    """Returns the checkpoint dict stored at `path`, or None if there is none."""
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        checkpoint = pickle.load(f)
+    if checkpoint.get('version') != CHECKPOINT_VERSION:
+        raise ValueError(f"Unsupported checkpoint version in {path}")
+    return checkpoint
+
+
+class Checkpointer:
+    def __init__(self, path, every_episodes=100, every_seconds=None, resume=False):
+        """
+        Args:
+            path (str): Checkpoint file (see checkpoint_path).
+            every_episodes (int): Checkpoint every N finished episodes (None: off).
+            every_seconds (float): Also checkpoint when this many seconds have
+                passed since the last one (None: off).
+            resume (bool): Continue from `path` if it exists.
+        """
+        self.path = path
+        self.every_episodes = every_episodes
+        self.every_seconds = every_seconds
+        self.resume = resume
+        self._last_time = time.monotonic()
+        self._thread = None
+        self._error = None
+
+    # -----------------------------
+    # Resume
+    # -----------------------------
+    def restore(self, agent, env, total_rewards, lengths, metrics=None, replay=None):
+        """
+        Loads the checkpoint into `agent`, `env`, the RNGs, the curve lists,
+        the metrics file and the replay buffer, if resuming and a checkpoint
+        exists.
+
+        Returns:
+            int: The first episode still to run (1 when starting fresh).
+        """
+        if not self.resume:
+            return 1
+        checkpoint = load_checkpoint(self.path)
+        if checkpoint is None:
+            return 1
+
+        agent.q_table = checkpoint['q_table']
+        agent.exploration_rate = checkpoint['exploration_rate']
+        random.setstate(checkpoint['random_state'])
+        np.random.set_state(checkpoint['numpy_state'])
+        if checkpoint['env_rng_state'] is not None:
+            env.rng = random.Random()
+            env.rng.setstate(checkpoint['env_rng_state'])
+        total_rewards[:] = checkpoint['total_rewards']
+        lengths[:] = checkpoint['lengths']
+        if metrics is not None:
+            metrics.truncate(checkpoint['metrics_offset'])
+        if replay is not None:
+            if checkpoint.get('replay') is None:
+                raise ValueError(f"{self.path} holds no replay buffer; it was saved by a run "
+                                 "without replay and cannot resume one that uses it")
+            replay.load_state_dict(checkpoint['replay'])
+        print(f"Resumed from {self.path} after episode {checkpoint['episode']}")
+        return checkpoint['episode'] + 1
+
+    # -----------------------------
+    # Saving
+    # -----------------------------
+    def due(self, episode):
+        if self.every_episodes and episode % self.every_episodes == 0:
+            return True
+        return bool(self.every_seconds) and time.monotonic() - self._last_time >= self.every_seconds
+
+    def maybe_save(self, episode, agent, env, total_rewards, lengths, metrics=None, replay=None):
+        """Checkpoints after `episode` if one is due."""
+        if self.due(episode):
+            self.save(episode, agent, env, total_rewards, lengths, metrics, replay)
+
+    def save(self, episode, agent, env, total_rewards, lengths, metrics=None, replay=None):
+        """
+        Snapshots the run after `episode` and writes it in the background.
+        Waits for the previous write first, so at most one is in flight.
+        """
+        self.wait()
+        checkpoint = {
+            'version': CHECKPOINT_VERSION,
+            'episode': episode,
+            'q_table': _copy_q_table(agent.q_table),
+            'exploration_rate': agent.exploration_rate,
+            'random_state': random.getstate(),
+            'numpy_state': np.random.get_state(),
+            'env_rng_state': env.rng.getstate() if isinstance(env.rng, random.Random) else None,
+            'total_rewards': list(total_rewards),
+            'lengths': list(lengths),
+            'metrics_offset': metrics.tell() if metrics is not None else 0,
+            'replay': replay.state_dict() if replay is not None else None,
+        }
+        self._last_time = time.monotonic()
+        self._thread = threading.Thread(target=self._write, args=(checkpoint,), daemon=True)
+        self._thread.start()
+
+    def _write(self, checkpoint):
+        try:
+            # Streamed to the file, so no second in-memory copy of the table
+            write_atomic(self.path, checkpoint)
+        except Exception as e:
+            self._error = e
+
+    def wait(self):
+        """Blocks until the pending write (if any) is on disk; re-raises its error."""
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        if self._error is not None:
+            error, self._error = self._error, None
+            raise error
+
+    def close(self):
+        self.wait()
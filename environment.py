@@ -1,18 +1,111 @@
 # environment.py
+#
+# Headless simulation core. All positions are grid cells (x, y) with
+# 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT; conversion to pixels only
+# happens in rendering.py, so this module never imports pygame.
 
 import random
-import pygame
-from settings import TILE_SIZE, GRID_WIDTH, GRID_HEIGHT, COLORS
+from array import array
+from collections import deque
+import numpy as np
+from settings import GRID_WIDTH, GRID_HEIGHT, ACTIONS
+
+# Clockwise direction order used by the vectorized environment:
+# turning right is +1, turning left is -1 (mod 4).
+DIRECTIONS = ['UP', 'RIGHT', 'DOWN', 'LEFT']
+DIRECTION_DELTAS = np.array([[0, -1], [1, 0], [0, 1], [-1, 0]], dtype=np.int64)
+# Direction change for each entry of ACTIONS ('STRAIGHT', 'LEFT', 'RIGHT')
+ACTION_TURNS = np.array([{'STRAIGHT': 0, 'LEFT': -1, 'RIGHT': 1}[a] for a in ACTIONS],
+                        dtype=np.int64)
+
+class Occupancy:
+    """
+    Number of snake segments on every grid cell, plus the list of free cells.
+    Cells outside the grid are never stored (they always read as empty).
+
+    Free cells are kept in `free` with their position in `slot`, so a cell
+    is added or removed with a swap-remove and a uniformly random free cell
+    is drawn in O(1). `bits` is the same information as a bitboard (bit
+    y * GRID_WIDTH + x set when the cell is occupied) for ray scans.
+    """
+    __slots__ = ('counts', 'free', 'slot', 'bits')
 
-class Snake:
     def __init__(self):
-        self.size = TILE_SIZE
-        start_x = GRID_WIDTH // 2 * TILE_SIZE
-        start_y = GRID_HEIGHT // 2 * TILE_SIZE
-        self.body = [[start_x, start_y]]
-        self.direction = random.choice(['UP', 'DOWN', 'LEFT', 'RIGHT'])
+        num_cells = GRID_WIDTH * GRID_HEIGHT
+        self.counts = bytearray(num_cells)
+        self.free = array('h', range(num_cells))
+        self.slot = array('h', range(num_cells))
+        self.bits = 0
+
+    def cell_index(self, x, y):
+        if 0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT:
+            return y * GRID_WIDTH + x
+        return None
+
+    def add(self, x, y):
+        idx = self.cell_index(x, y)
+        if idx is not None:
+            self.counts[idx] += 1
+            if self.counts[idx] == 1:
+                self.bits |= 1 << idx
+                # Swap-remove idx from the free list
+                pos = self.slot[idx]
+                last = self.free.pop()
+                if last != idx:
+                    self.free[pos] = last
+                    self.slot[last] = pos
+
+    def remove(self, x, y):
+        idx = self.cell_index(x, y)
+        if idx is not None:
+            self.counts[idx] -= 1
+            if self.counts[idx] == 0:
+                self.bits &= ~(1 << idx)
+                self.slot[idx] = len(self.free)
+                self.free.append(idx)
+
+    def count(self, x, y):
+        idx = self.cell_index(x, y)
+        return 0 if idx is None else self.counts[idx]
+
+    def random_free_cell(self, rng=random):
+        """Uniformly random unoccupied (x, y), or None if the board is full."""
+        if not self.free:
+            return None
+        idx = self.free[rng.randrange(len(self.free))]
+        return (idx % GRID_WIDTH, idx // GRID_WIDTH)
+
+class Snake:
+    """
+    The body is a deque of (x, y) tuples with the head on the left, so moving
+    is O(1) at both ends.
+    """
+    __slots__ = ('body', 'occupancy', 'direction', 'growing')
+
+    def __init__(self, rng=random):
+        start_x = GRID_WIDTH // 2
+        start_y = GRID_HEIGHT // 2
+        self.body = deque([(start_x, start_y)])
+        self.occupancy = Occupancy()
+        self.occupancy.add(start_x, start_y)
+        self.direction = rng.choice(['UP', 'DOWN', 'LEFT', 'RIGHT'])
         self.growing = False
-    
+
+    @property
+    def head(self):
+        return self.body[0]
+
+    @property
+    def tail(self):
+        return self.body[-1]
+
+    @property
+    def length(self):
+        return len(self.body)
+
+    def __len__(self):
+        return len(self.body)
+
     def move(self, action):
         # Update direction based on action
         if action == 'LEFT':
@@ -21,33 +114,35 @@ class Snake:
             self.direction = self.turn_right(self.direction)
         # If action is 'STRAIGHT', keep direction
 
-        head = self.body[0][:]
-        if self.direction == 'UP':
-            head[1] -= self.size
-        elif self.direction == 'DOWN':
-            head[1] += self.size
-        elif self.direction == 'LEFT':
-            head[0] -= self.size
-        elif self.direction == 'RIGHT':
-            head[0] += self.size
-
-        self.body.insert(0, head)  # new head
+        head = self.get_next_position(self.direction)
+        self.body.appendleft(head)  # new head
+        self.occupancy.add(head[0], head[1])
         if not self.growing:
-            self.body.pop()
+            tail = self.body.pop()
+            self.occupancy.remove(tail[0], tail[1])
         else:
             self.growing = False
 
+    def occupies(self, x, y):
+        """True if any body segment (head and tail included) is on (x, y)."""
+        return self.occupancy.count(x, y) > 0
+
+    def hits_itself(self):
+        """True if the head shares its cell with another body segment."""
+        head_x, head_y = self.body[0]
+        return self.occupancy.count(head_x, head_y) > 1
+
     def get_next_position(self, direction):
-        head = self.body[0][:]
+        x, y = self.body[0]
         if direction == 'UP':
-            head[1] -= self.size
+            y -= 1
         elif direction == 'DOWN':
-            head[1] += self.size
+            y += 1
         elif direction == 'LEFT':
-            head[0] -= self.size
+            x -= 1
         elif direction == 'RIGHT':
-            head[0] += self.size
-        return head
+            x += 1
+        return (x, y)
 
     def turn_left(self, current_direction):
         directions = ['UP', 'LEFT', 'DOWN', 'RIGHT']
@@ -62,30 +157,22 @@ class Snake:
     def grow(self):
         self.growing = True
 
-    def draw(self, surface):
-        for i, segment in enumerate(self.body):
-            color = COLORS['dark_green'] if i == 0 else COLORS['green']
-            rect = pygame.Rect(segment[0], segment[1], self.size, self.size)
-            pygame.draw.rect(surface, color, rect, border_radius=5)
-
 class Food:
-    def __init__(self):
-        self.size = TILE_SIZE
-        self.position = self.random_position()
+    __slots__ = ('position',)
 
-    def random_position(self):
-        return [
-            random.randrange(0, GRID_WIDTH) * TILE_SIZE,
-            random.randrange(0, GRID_HEIGHT) * TILE_SIZE
-        ]
+    def __init__(self, position=None, rng=random):
+        self.position = self.random_position(rng) if position is None else position
 
-    def draw(self, surface):
-        rect = pygame.Rect(self.position[0], self.position[1],
-                           self.size, self.size)
-        pygame.draw.rect(surface, COLORS['red'], rect, border_radius=5)
+    def random_position(self, rng=random):
+        return (
+            rng.randrange(0, GRID_WIDTH),
+            rng.randrange(0, GRID_HEIGHT)
+        )
 
 class Environment:
-    def __init__(self, rewards):
+    __slots__ = ('rewards', 'snake', 'food', 'score', 'rng')
+
+    def __init__(self, rewards, seed=None):
         """
         'rewards' is a dictionary, e.g.:
          {
@@ -95,13 +182,23 @@ class Environment:
             'step': -10,
             'closer_to_food': 0.3  # optional
          }
+        'seed' gives the environment its own random.Random (see reset);
+        by default it draws from the global `random` module.
         """
         self.rewards = rewards
-        self.reset()
+        self.rng = random
+        self.reset(seed)
 
-    def reset(self):
-        self.snake = Snake()
-        self.food = Food()
+    def reset(self, seed=None):
+        """
+        Starts a new episode. With a seed, the environment switches to a
+        private random.Random(seed), so the initial direction and every food
+        position depend only on the seed and the actions taken.
+        """
+        if seed is not None:
+            self.rng = random.Random(seed)
+        self.snake = Snake(self.rng)
+        self.food = Food(rng=self.rng)
         self.score = 0
 
     def step(self, action):
@@ -123,27 +220,23 @@ class Environment:
         done = False
 
         # 4) Check collision with walls
-        head_x, head_y = self.snake.body[0]
-        if (head_x < 0 or head_x >= GRID_WIDTH * TILE_SIZE or
-            head_y < 0 or head_y >= GRID_HEIGHT * TILE_SIZE):
+        head_x, head_y = self.snake.head
+        if (head_x < 0 or head_x >= GRID_WIDTH or
+            head_y < 0 or head_y >= GRID_HEIGHT):
             reward += self.rewards.get('hit_wall', 0)
             done = True
 
         # 5) Check collision with itself
         if not done:  # only check if we're not already done
-            if self.snake.body[0] in self.snake.body[1:]:
+            if self.snake.hits_itself():
                 reward += self.rewards.get('hit_snake', 0)
                 done = True
 
         # 6) Check if food is eaten
-        if not done and self.snake.body[0] == self.food.position:
+        if not done and self.snake.head == self.food.position:
             reward += self.rewards.get('food', 0)
             self.snake.grow()
-            # Re-spawn food in a valid position
-            while True:
-                self.food = Food()
-                if self.food.position not in self.snake.body:
-                    break
+            self.spawn_food()
 
         # 7) If not done, check 'closer_to_food' or 'step' penalty
         if not done:
@@ -160,24 +253,173 @@ class Environment:
         self.score += reward
         return reward, done
 
+    def spawn_food(self):
+        """Re-spawns the food on a uniformly random cell not covered by the snake."""
+        position = self.snake.occupancy.random_free_cell(self.rng)
+        if position is not None:
+            self.food = Food(position)
+
     def distance_to_food(self):
         """Simple Euclidean or Manhattan distance from snake head to food."""
-        head_x, head_y = self.snake.body[0]
+        head_x, head_y = self.snake.head
         fx, fy = self.food.position
         return abs(head_x - fx) + abs(head_y - fy)
 
     def draw(self, surface, font, episode):
-        surface.fill(COLORS['black'])
-        self.draw_grid(surface)
-        self.snake.draw(surface)
-        self.food.draw(surface)
-
-        text = f"Score: {self.score:.1f} | Episode: {episode}"
-        text_surface = font.render(text, True, COLORS['white'])
-        surface.blit(text_surface, (10, 10))
-
-    def draw_grid(self, surface):
-        for x in range(0, GRID_WIDTH * TILE_SIZE, TILE_SIZE):
-            pygame.draw.line(surface, COLORS['light_gray'], (x, 0), (x, GRID_HEIGHT * TILE_SIZE))
-        for y in range(0, GRID_HEIGHT * TILE_SIZE, TILE_SIZE):
-            pygame.draw.line(surface, COLORS['light_gray'], (0, y), (GRID_WIDTH * TILE_SIZE, y))
\ No newline at end of file
+        # Imported here so that headless training never loads pygame
+        from rendering import draw_environment
+        draw_environment(surface, font, self, episode)
+
+
+class VecEnvironment:
+    def __init__(self, num_envs, rewards, seed=None):
+        """
+        Steps `num_envs` independent boards in lockstep with NumPy.
+
+        Positions are stored in grid cells, like Environment. Every board follows
+        the same rules as Environment.step, and boards that finish an episode
+        are reset automatically at the end of the step that finished them.
+
+        Args:
+            num_envs: Number of concurrent boards.
+            rewards: Reward dictionary, e.g. REWARD_SETTINGS["R1"].
+            seed: Optional seed for the board RNG.
+        """
+        self.num_envs = num_envs
+        self.rewards = rewards
+        self.rng = np.random.default_rng(seed)
+
+        self.capacity = GRID_WIDTH * GRID_HEIGHT + 1
+        self._index = np.arange(num_envs)
+
+        # Body ring buffers: the head lives at body[i, head_ptr[i]] and the
+        # tail `lengths[i] - 1` slots behind it.
+        self.body = np.zeros((num_envs, self.capacity, 2), dtype=np.int16)
+        self.head_ptr = np.zeros(num_envs, dtype=np.int64)
+        self.lengths = np.ones(num_envs, dtype=np.int64)
+        self.heads = np.zeros((num_envs, 2), dtype=np.int64)
+        self.directions = np.zeros(num_envs, dtype=np.int64)
+        self.growing = np.zeros(num_envs, dtype=bool)
+        self.food = np.zeros((num_envs, 2), dtype=np.int64)
+        self.occupancy = np.zeros((num_envs, GRID_HEIGHT, GRID_WIDTH), dtype=bool)
+
+        self.scores = np.zeros(num_envs, dtype=np.float64)
+        self.dones = np.zeros(num_envs, dtype=bool)
+        # Length and score of the episodes that finished on the last step
+        # (only meaningful where self.dones is True).
+        self.final_lengths = np.zeros(num_envs, dtype=np.int64)
+        self.final_scores = np.zeros(num_envs, dtype=np.float64)
+
+        self.reset()
+
+    def reset(self, indices=None):
+        """
+        Resets the given boards (all boards if `indices` is None) to a
+        length-1 snake in the centre with a random direction and random food.
+        """
+        if indices is None:
+            indices = self._index
+        indices = np.asarray(indices)
+        n = len(indices)
+        if n == 0:
+            return
+
+        start = np.array([GRID_WIDTH // 2, GRID_HEIGHT // 2], dtype=np.int64)
+        self.occupancy[indices] = False
+        self.head_ptr[indices] = 0
+        self.lengths[indices] = 1
+        self.body[indices, 0] = start
+        self.heads[indices] = start
+        self.occupancy[indices, start[1], start[0]] = True
+        self.directions[indices] = self.rng.integers(0, 4, size=n)
+        self.growing[indices] = False
+        self.scores[indices] = 0.0
+
+        # Like Food(), the initial food may land anywhere on the board.
+        self.food[indices, 0] = self.rng.integers(0, GRID_WIDTH, size=n)
+        self.food[indices, 1] = self.rng.integers(0, GRID_HEIGHT, size=n)
+
+    def tails(self):
+        """Returns the (num_envs, 2) array of tail cells."""
+        tail_ptr = (self.head_ptr - self.lengths + 1) % self.capacity
+        return self.body[self._index, tail_ptr].astype(np.int64)
+
+    def step(self, actions):
+        """
+        Applies one action per board (indices into ACTIONS).
+
+        Returns:
+            tuple: (rewards, dones) as arrays of shape (num_envs,).
+        """
+        idx = self._index
+        actions = np.asarray(actions, dtype=np.int64)
+        w_reward = self.rewards
+
+        old_distance = np.abs(self.heads - self.food).sum(axis=1)
+
+        # 1) Turn and move the head
+        self.directions = (self.directions + ACTION_TURNS[actions]) % 4
+        new_heads = self.heads + DIRECTION_DELTAS[self.directions]
+
+        # 2) Drop the tail of boards that are not growing
+        popping = ~self.growing
+        tails = self.tails()
+        self.occupancy[idx[popping], tails[popping, 1], tails[popping, 0]] = False
+        self.lengths += self.growing
+        self.growing[:] = False
+
+        self.head_ptr = (self.head_ptr + 1) % self.capacity
+        self.body[idx, self.head_ptr] = new_heads
+        self.heads = new_heads
+        hx, hy = new_heads[:, 0], new_heads[:, 1]
+
+        # 3) Wall and self collisions
+        hit_wall = (hx < 0) | (hx >= GRID_WIDTH) | (hy < 0) | (hy >= GRID_HEIGHT)
+        inside = ~hit_wall
+        hit_snake = np.zeros(self.num_envs, dtype=bool)
+        hit_snake[inside] = self.occupancy[idx[inside], hy[inside], hx[inside]]
+        self.occupancy[idx[inside], hy[inside], hx[inside]] = True
+
+        done = hit_wall | hit_snake
+        alive = ~done
+        reward = np.zeros(self.num_envs, dtype=np.float64)
+        reward[hit_wall] += w_reward.get('hit_wall', 0)
+        reward[hit_snake] += w_reward.get('hit_snake', 0)
+
+        # 4) Food
+        ate = alive & (hx == self.food[:, 0]) & (hy == self.food[:, 1])
+        if ate.any():
+            reward[ate] += w_reward.get('food', 0)
+            self.growing[ate] = True
+            self._respawn_food(idx[ate])
+
+        # 5) 'closer_to_food' or 'step' penalty, measured against the
+        #    (possibly re-spawned) food exactly like Environment.step
+        if 'closer_to_food' in w_reward:
+            new_distance = np.abs(self.heads - self.food).sum(axis=1)
+            closer = new_distance < old_distance
+            reward[alive & closer] += w_reward['closer_to_food']
+            reward[alive & ~closer] += w_reward.get('step', 0)
+        else:
+            reward[alive] += w_reward.get('step', 0)
+
+        self.scores += reward
+
+        # 6) Record and auto-reset finished boards
+        self.dones = done
+        if done.any():
+            finished = idx[done]
+            self.final_lengths[finished] = self.lengths[finished]
+            self.final_scores[finished] = self.scores[finished]
+            self.reset(finished)
+
+        return reward, done
+
+    def _respawn_food(self, indices):
+        """Places food uniformly on a free cell of each board in `indices`."""
+        free = ~self.occupancy[indices].reshape(len(indices), -1)
+        keys = self.rng.random(free.shape)
+        keys[~free] = -1.0
+        cells = np.argmax(keys, axis=1)
+        self.food[indices, 0] = cells % GRID_WIDTH
+        self.food[indices, 1] = cells // GRID_WIDTH
@@ -1,11 +1,18 @@
 import os
 import glob
+import random
+import time
+import zlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
-from agent import Agent           # Q-learning agent
-from sarsa_agent import SarsaAgent  # SARSA agent
+from agent import Agent, QLambdaAgent             # Q-learning agents
+from sarsa_agent import SarsaAgent, SarsaLambdaAgent  # SARSA agents
 from environment import Environment
-from settings import STATE_SPACES, REWARD_SETTINGS
+from qtable_io import QTB_EXTENSION, parse_state_reward
+from settings import ACTIONS, STATE_SPACES, REWARD_SETTINGS
 
 
 def evaluate_agent(qtable_path, agent_class, state_space, rewards, num_episodes=1000, max_steps=1000):
@@ -26,7 +33,42 @@ def evaluate_agent(qtable_path, agent_class, state_space, rewards, num_episodes=
     agent = agent_class(state_space=state_space, exploration_rate=0.0)
     agent.load_q_table(qtable_path)
 
+    lengths, _ = run_episodes(agent, rewards, num_episodes, max_steps)
+
+    return max(lengths), min(lengths), sum(lengths) / len(lengths)
+
+
+def greedy_policy(q_table):
+    """
+    Returns choose(state), acting like choose_action with exploration rate
+    0 (same random draws; an unseen state gets a random action the first
+    time and then acts like a zero row) but without writing to `q_table`,
+    so one loaded table can be shared by any number of evaluation runs.
+    """
+    unseen = set()
+
+    def choose(state):
+        random.random()  # the exploration draw of choose_action
+        if state in q_table:
+            return ACTIONS[np.argmax(q_table[state])]
+        if state in unseen:
+            return ACTIONS[0]
+        unseen.add(state)
+        return random.choice(ACTIONS)
+    return choose
+
+
+def run_episodes(agent, rewards, num_episodes, max_steps):
+    """
+    Plays `num_episodes` episodes with `agent`'s greedy policy. The agent's
+    Q-table is left unchanged.
+
+    Returns:
+        tuple: (list of final snake lengths, total number of steps).
+    """
     lengths = []
+    total_steps = 0
+    choose_action = greedy_policy(agent.q_table)
 
     for _ in range(num_episodes):
         env = Environment(rewards=rewards)
@@ -35,7 +77,7 @@ def evaluate_agent(qtable_path, agent_class, state_space, rewards, num_episodes=
         steps = 0
 
         while not done:
-            action = agent.choose_action(state)
+            action = choose_action(state)
             reward, done = env.step(action)
             state = agent.get_state(env.snake, env.food)
 
@@ -43,93 +85,190 @@ def evaluate_agent(qtable_path, agent_class, state_space, rewards, num_episodes=
             if steps >= max_steps:  # Terminate the episode if step limit is reached
                 break
 
-        lengths.append(len(env.snake.body))
+        lengths.append(env.snake.length)
+        total_steps += steps
 
-    return max(lengths), min(lengths), sum(lengths) / len(lengths)
+    return lengths, total_steps
 
 
-def parse_state_reward(filename):
-    """
-    Parses the state and reward from the Q-table filename.
+AGENT_CLASSES = {"Q-Learning": Agent, "SARSA": SarsaAgent,
+                 "Q(lambda)": QLambdaAgent, "SARSA(lambda)": SarsaLambdaAgent,
+                 "Q-Learning (async)": Agent, "Q-Learning (param server)": Agent}
 
-    Args:
-        filename (str): Filename of the Q-table.
+# Agents already loaded by this (worker) process, keyed by (qtable_path, agent_name),
+# so each Q-table is loaded once per worker no matter how many shards it runs.
+# run_episodes never writes to their tables, so a shard's result does not
+# depend on which shards the worker ran before it.
+_loaded_agents = {}
+
+
+def evaluate_shard(qtable_path, agent_name, state, reward, num_episodes, max_steps, seed):
+    """
+    Runs one shard of a table's evaluation episodes (in a worker process).
 
     Returns:
-        tuple: (state, reward) or (None, None) if parsing fails.
+        dict: best/worst/total length, episode and step counts and the
+        shard's wall time, so shards can be merged exactly.
+    """
+    key = (qtable_path, agent_name)
+    agent = _loaded_agents.get(key)
+    if agent is None:
+        agent = AGENT_CLASSES[agent_name](state_space=STATE_SPACES[state], exploration_rate=0.0)
+        agent.load_q_table(qtable_path)
+        _loaded_agents[key] = agent
+
+    random.seed(seed)
+    start = time.perf_counter()
+    lengths, steps = run_episodes(agent, REWARD_SETTINGS[reward], num_episodes, max_steps)
+    return {
+        "best": max(lengths),
+        "worst": min(lengths),
+        "total_length": sum(lengths),
+        "episodes": len(lengths),
+        "steps": steps,
+        "elapsed": time.perf_counter() - start
+    }
+
+
+def find_tables(directory):
     """
-    base = os.path.basename(filename).replace('.pkl', '')
-    parts = base.split('_')
-    state, reward = None, None
-    for p in parts:
-        if p in STATE_SPACES:
-            state = p
-        if p in REWARD_SETTINGS:
-            reward = p
-    return state, reward
+    Lists the Q-tables in `directory`. When both 'name.pkl' and 'name.qtb'
+    exist, the memory-mapped .qtb file is used.
+    """
+    tables = {}
+    for path in sorted(glob.glob(os.path.join(directory, "*.pkl"))):
+        tables[os.path.splitext(path)[0]] = path
+    for path in sorted(glob.glob(os.path.join(directory, "*" + QTB_EXTENSION))):
+        tables[os.path.splitext(path)[0]] = path
+    return list(tables.values())
 
 
-def evaluate_all_tables(num_episodes=1000, max_steps=1000):
+def list_tables():
+    """
+    Returns [(path, agent_name, state, reward)] for every Q-learning and
+    SARSA table (one-step and lambda variants, plus the shared tables of
+    async_training.py and param_server.py) whose filename can be parsed.
     """
-    Evaluates all Q-tables (Q-learning and SARSA) and returns a sorted table of results.
+    tables = []
+    for agent_name, directory in (("Q-Learning", "q_tables"), ("SARSA", "q_tables_sarsa"),
+                                  ("Q(lambda)", "q_tables_qlambda"),
+                                  ("SARSA(lambda)", "q_tables_sarsa_lambda"),
+                                  ("Q-Learning (async)", "q_tables_async"),
+                                  ("Q-Learning (param server)", "q_tables_ps")):
+        for path in find_tables(directory):
+            state, reward = parse_state_reward(path)
+            if not state or not reward:
+                print(f"Skipping file: {path} (could not parse state or reward)")
+                continue
+            tables.append((path, agent_name, state, reward))
+    return tables
+
+
+def _shard_jobs(tables, num_episodes, max_steps, shards, seed):
+    """Yields (key, evaluate_shard arguments) for every shard of every table."""
+    for path, agent_name, state, reward in tables:
+        for shard in range(shards):
+            shard_episodes = num_episodes // shards + (shard < num_episodes % shards)
+            shard_seed = zlib.crc32(f"{seed}_{path}_{agent_name}_{shard}".encode())
+            yield (path, agent_name), (path, agent_name, state, reward, shard_episodes, max_steps, shard_seed)
+
+
+def _merge_shard(total, part):
+    total["best"] = max(total["best"], part["best"])
+    total["worst"] = part["worst"] if total["worst"] is None else min(total["worst"], part["worst"])
+    for field in ("total_length", "episodes", "steps", "elapsed"):
+        total[field] += part[field]
+
+
+def evaluate_all_tables(num_episodes=1000, max_steps=1000, workers=1, shards=None, seed=0):
+    """
+    Evaluates all Q-tables (Q-learning, SARSA, their lambda variants, async and
+    parameter-server Q-learning) and returns a sorted table of results.
+
+    Every table's episodes are split into `shards` runs, each seeded from
+    (seed, table, shard). The results depend only on `seed` and `shards`,
+    not on `workers`: a serial run and a parallel run with the same seed
+    and shards give identical results.
 
     Args:
         num_episodes (int): Number of episodes for evaluation.
         max_steps (int): Maximum steps per episode.
+        workers (int): Worker processes. 1 evaluates serially in this process;
+            anything else (None = all cores) uses a process pool.
+        shards (int): Shards per table (default: 1 when serial, else workers).
+        seed (int): Base seed for the shards.
 
     Returns:
         pandas.DataFrame: Table of results sorted by average length.
     """
-    q_files = glob.glob("q_tables/*.pkl")
-    sarsa_files = glob.glob("q_tables_sarsa/*.pkl")
+    if workers != 1:
+        return evaluate_all_tables_parallel(num_episodes, max_steps, workers, shards, seed)
+
+    shards = max(1, min(shards or 1, num_episodes))
+    tables = list_tables()
+    merged = {}
+    for key, args in _shard_jobs(tables, num_episodes, max_steps, shards, seed):
+        if key not in merged:
+            print(f"Evaluating {key[1]} for {args[2]} + {args[3]}...")
+            merged[key] = {"best": 0, "worst": None, "total_length": 0,
+                           "episodes": 0, "steps": 0, "elapsed": 0.0}
+        _merge_shard(merged[key], evaluate_shard(*args))
+    return _results_frame(tables, merged)
+
+
+def evaluate_all_tables_parallel(num_episodes=1000, max_steps=1000, workers=None, shards=None, seed=0):
+    """
+    Like evaluate_all_tables, but runs the shards on a process pool (shards
+    of different tables run side by side). Best/worst/average lengths are
+    merged exactly from the shards, and per-table throughput is printed as
+    each table completes.
+    """
+    workers = workers or os.cpu_count()
+    shards = max(1, min(shards or workers, num_episodes))
+    tables = list_tables()
+
+    pending = {}
+    merged = {}
+    wall_start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for key, args in _shard_jobs(tables, num_episodes, max_steps, shards, seed):
+            if key not in merged:
+                pending[key] = shards
+                merged[key] = {"best": 0, "worst": None, "total_length": 0,
+                               "episodes": 0, "steps": 0, "elapsed": 0.0}
+            futures[pool.submit(evaluate_shard, *args)] = key
+
+        for future in as_completed(futures):
+            key = futures[future]
+            total = merged[key]
+            _merge_shard(total, future.result())
+
+            pending[key] -= 1
+            if pending[key] == 0:
+                # Throughput per worker-second spent on this table
+                print(f"Evaluated {key[1]} {os.path.basename(key[0])}: "
+                      f"{total['episodes'] / total['elapsed']:.1f} episodes/s, "
+                      f"{total['steps'] / total['elapsed']:.0f} steps/s")
+
+    wall = time.perf_counter() - wall_start
+    total_steps = sum(total["steps"] for total in merged.values())
+    print(f"Evaluated {len(tables)} tables with {workers} workers in {wall:.1f}s "
+          f"({total_steps / wall:.0f} steps/s overall)")
+    return _results_frame(tables, merged)
+
+
+def _results_frame(tables, merged):
     results = []
-
-    # Evaluate Q-learning Q-tables
-    for qfile in q_files:
-        state, reward = parse_state_reward(qfile)
-        if not state or not reward:
-            print(f"Skipping file: {qfile} (could not parse state or reward)")
-            continue
-        print(f"Evaluating Q-learning for {state} + {reward}...")
-        best, worst, avg = evaluate_agent(
-            qtable_path=qfile,
-            agent_class=Agent,
-            state_space=STATE_SPACES[state],
-            rewards=REWARD_SETTINGS[reward],
-            num_episodes=num_episodes,
-            max_steps=max_steps
-        )
-        results.append({
-            "State": state,
-            "Reward": reward,
-            "Agent": "Q-Learning",
-            "Best Length": best,
-            "Worst Length": worst,
-            "Average Length": avg
-        })
-
-    # Evaluate SARSA Q-tables
-    for sfile in sarsa_files:
-        state, reward = parse_state_reward(sfile)
-        if not state or not reward:
-            print(f"Skipping file: {sfile} (could not parse state or reward)")
-            continue
-        print(f"Evaluating SARSA for {state} + {reward}...")
-        best, worst, avg = evaluate_agent(
-            qtable_path=sfile,
-            agent_class=SarsaAgent,
-            state_space=STATE_SPACES[state],
-            rewards=REWARD_SETTINGS[reward],
-            num_episodes=num_episodes,
-            max_steps=max_steps
-        )
+    for path, agent_name, state, reward in tables:
+        total = merged[(path, agent_name)]
         results.append({
             "State": state,
             "Reward": reward,
-            "Agent": "SARSA",
-            "Best Length": best,
-            "Worst Length": worst,
-            "Average Length": avg
+            "Agent": agent_name,
+            "Best Length": total["best"],
+            "Worst Length": total["worst"],
+            "Average Length": total["total_length"] / total["episodes"]
         })
 
     df = pd.DataFrame(results)
@@ -170,18 +309,32 @@ def plot_results(df, num_episodes, max_steps):
 
 
 def main():
-    num_episodes = 10000
-    max_steps = 5000  # Limit each episode to 1000 steps to prevent infinite loops
+    parser = argparse.ArgumentParser(description="Evaluate all saved Q-tables.")
+    parser.add_argument('--episodes', type=int, default=10000, help="Evaluation episodes per table")
+    parser.add_argument('--max-steps', type=int, default=5000, help="Step limit per episode")
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (1 = serial, 0 = all cores)")
+    parser.add_argument('--shards', type=int, default=None,
+                        help="Shards per table (default: 1 serial, workers in parallel); results depend on "
+                             "--seed and --shards only")
+    parser.add_argument('--seed', type=int, default=0, help="Base seed for the shards")
+    parser.add_argument('--no-plot', action='store_true', help="Skip the results plot")
+    args = parser.parse_args()
+
+    num_episodes = args.episodes
+    max_steps = args.max_steps  # Limit each episode to prevent infinite loops
 
     # Evaluate and get the results as a DataFrame
-    results_table = evaluate_all_tables(num_episodes=num_episodes, max_steps=max_steps)
+    results_table = evaluate_all_tables(num_episodes=num_episodes, max_steps=max_steps,
+                                        workers=args.workers or None, shards=args.shards,
+                                        seed=args.seed)
 
     # Print the table in the console
     print("==== Evaluation Results ====")
     print(results_table)
 
     # Plot the sorted results
-    plot_results(results_table, num_episodes, max_steps)
+    if not args.no_plot:
+        plot_results(results_table, num_episodes, max_steps)
 
     # Save the table to a CSV file for further analysis
     results_table.to_csv("evaluation_results.csv", index=False)
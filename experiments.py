@@ -4,12 +4,15 @@ import numpy as np
 import matplotlib.pyplot as plt
 import os
 from settings import (
-    STATE_SPACES, REWARD_SETTINGS, NUM_EPISODES, MAX_STEPS_PER_EPISODE
+    STATE_SPACES, REWARD_SETTINGS, NUM_EPISODES, MAX_STEPS_PER_EPISODE,
+    ACTIONS, REPLAY_BATCH_SIZE, REPLAY_START, REPLAY_MAX_DENSE_ROWS
 )
 from environment import Environment
 from agent import Agent
+from qtable import dense_layout
+from instrumentation import start_profiler, stop_profiler
+from metrics import MetricsSink, metrics_path
 
-import pygame
 import sys
 from environment import Environment
 from agent import Agent
@@ -18,48 +21,140 @@ from settings import (
     MAX_STEPS_PER_EPISODE
 )
 
-def run_experiment(state_space, rewards, num_episodes=1000, show_game=False):
-    agent = Agent(state_space=state_space)
+def run_experiment(state_space, rewards, num_episodes=1000, show_game=False,
+                   timer=None, profile_path=None, metrics=None, watch=False,
+                   checkpointer=None, agent_class=Agent, replay=None,
+                   replay_batch=REPLAY_BATCH_SIZE):
+    """
+    Trains a Q-learning agent.
+
+    Args:
+        timer (PhaseTimer): Optional; accumulates time per phase (env.step,
+            get_state, choose_action, learn, render). Off by default.
+        profile_path (str): Optional path prefix; the run is wrapped in
+            cProfile and written to <prefix>.prof and <prefix>.folded.
+        metrics (MetricsSink): Optional; every episode is streamed to it and
+            total_rewards / lengths are not kept (they come back empty).
+        watch (bool): Open a window that samples the board at FPS from a
+            separate process while training runs at full speed (see watch.py).
+        checkpointer (Checkpointer): Optional; saves the run periodically and,
+            if it was created with resume=True, continues from its last
+            checkpoint (see checkpoint.py).
+        agent_class: Agent or a subclass with the same interface
+            (e.g. QLambdaAgent).
+        replay (ReplayBuffer): Optional; every transition is also stored in
+            it and, once REPLAY_START are stored, a minibatch of
+            `replay_batch` is replayed after each step (see replay.py). The
+            agent then uses a dense Q-table, so states are row indices.
+            That table preallocates 13 bytes per state of the layout and is
+            copied into every checkpoint, so replay is only accepted for
+            layouts of at most REPLAY_MAX_DENSE_ROWS states (S1, S2, S5);
+            S4 (31.5M states, ~390 MB) and S3 (no layout) raise ValueError.
+
+    Returns:
+        tuple: (total_rewards, lengths, agent)
+    """
+    if replay is not None:
+        layout = dense_layout(state_space)
+        if layout.size > REPLAY_MAX_DENSE_ROWS:
+            raise ValueError(
+                f"Replay needs a dense Q-table, and the {layout.name} layout has {layout.size:,} "
+                f"states (~{layout.size * 13 / 2**20:,.0f} MB); only layouts up to "
+                f"REPLAY_MAX_DENSE_ROWS={REPLAY_MAX_DENSE_ROWS:,} are supported")
+    agent = agent_class(state_space=state_space, dense=replay is not None)
     env = Environment(rewards=rewards)
+    profiler = start_profiler() if profile_path else None
+    watcher = None
+    if watch:
+        from watch import Watcher
+        watcher = Watcher()
     
     total_rewards = []
     lengths = []
 
     if show_game:
+        # Imported here so that headless training never loads pygame
+        import pygame
         pygame.init()
         screen = pygame.display.set_mode((800, 600))
         clock = pygame.time.Clock()
         font = pygame.font.SysFont("arial", 20)
-
-    for episode in range(1, num_episodes + 1):
+        from rendering import IncrementalRenderer
+        renderer = IncrementalRenderer(screen, font)
+
+        def render(episode):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+            renderer.draw(env, episode)
+            clock.tick(15)
+
+    if replay is not None:
+        from replay import replay_update
+
+    # Bound methods are looked up once; with a timer they are wrapped instead
+    step, get_state = env.step, agent.get_state
+    choose_action, learn = agent.choose_action, agent.learn
+    if timer is not None:
+        step = timer.wrap('env.step', step)
+        get_state = timer.wrap('get_state', get_state)
+        choose_action = timer.wrap('choose_action', choose_action)
+        learn = timer.wrap('learn', learn)
+        if replay is not None:
+            replay_update = timer.wrap('replay', replay_update)
+        if show_game:
+            render = timer.wrap('render', render)
+
+    start_episode = 1
+    if checkpointer is not None:
+        start_episode = checkpointer.restore(agent, env, total_rewards, lengths, metrics, replay)
+
+    for episode in range(start_episode, num_episodes + 1):
         env.reset()
-        state = agent.get_state(env.snake, env.food)
+        state = get_state(env.snake, env.food)
         done = False
         episode_reward = 0
+        steps = 0
 
         while not done:
-            action = agent.choose_action(state)
-            reward, done = env.step(action)
-            next_state = agent.get_state(env.snake, env.food)
-            agent.learn(state, action, reward, next_state, done)
+            action = choose_action(state)
+            reward, done = step(action)
+            steps += 1
+            next_state = get_state(env.snake, env.food)
+            learn(state, action, reward, next_state, done)
+            if replay is not None:
+                replay.add(state, ACTIONS.index(action), reward, next_state, done)
+                if len(replay) >= REPLAY_START:
+                    replay_update(agent, replay, replay_batch)
             state = next_state
             episode_reward += reward
 
             if show_game:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                env.draw(screen, font, episode)
-                pygame.display.update()
-                clock.tick(15)
+                render(episode)
+            if watcher is not None:
+                watcher.observe(env, episode)
 
         agent.update_exploration_rate()
-        total_rewards.append(episode_reward)
-        lengths.append(len(env.snake.body))
+        if metrics is not None:
+            metrics.record(episode, episode_reward, env.snake.length, steps,
+                           agent.exploration_rate, len(agent.q_table))
+        else:
+            total_rewards.append(episode_reward)
+            lengths.append(env.snake.length)
+        if checkpointer is not None:
+            checkpointer.maybe_save(episode, agent, env, total_rewards, lengths, metrics, replay)
 
     if show_game:
         pygame.quit()
+    if watcher is not None:
+        watcher.close()
+    if checkpointer is not None:
+        checkpointer.close()
+    if profiler is not None:
+        stop_profiler(profiler, profile_path)
+    if metrics is not None:
+        metrics.flush()
 
     return total_rewards, lengths, agent
 
@@ -158,43 +253,65 @@ def plot_results(results, step=20, window_size=50):
     plt.show()
 
 
-def run_all_experiments():
+def run_all_experiments(metrics=None):
     """
     Runs all combinations of state spaces and reward settings,
     then creates a separate plot for each reward to compare different state spaces.
+
+    Args:
+        metrics (str): 'jsonl' or 'csv' to stream per-episode metrics to
+            q_tables/*_metrics.<ext> instead of keeping the curves in memory
+            (they come back empty); the plots are then saved from those
+            files (metrics_<reward>.png) instead of being shown.
     """
     # Structure to hold data:
     # results[reward_name][state_name] = (total_rewards, lengths)
     results = {}
+    metrics_files = {}
 
     # Initialize the nested dictionary
     for reward_name in REWARD_SETTINGS:
         results[reward_name] = {}
+        metrics_files[reward_name] = []
+    os.makedirs("q_tables", exist_ok=True)
 
     # 1. Run all combinations
     for reward_name, rewards in REWARD_SETTINGS.items():
         for state_name, state_space in STATE_SPACES.items():
             experiment_key = f"{state_name}_{reward_name}"
             print(f"=== Running {experiment_key} ===")
+            q_table_filename = f"q_tables/q_table_{experiment_key}.pkl"
+            sink = None
+            if metrics:
+                metrics_files[reward_name].append(metrics_path(q_table_filename, '.' + metrics))
+                sink = MetricsSink(metrics_files[reward_name][-1])
 
             # Run the experiment
-            total_rewards, lengths, agent = run_experiment(
-                state_space=state_space,
-                rewards=rewards,
-                num_episodes=NUM_EPISODES,
-                show_game=False
-            )
+            try:
+                total_rewards, lengths, agent = run_experiment(
+                    state_space=state_space,
+                    rewards=rewards,
+                    num_episodes=NUM_EPISODES,
+                    show_game=False,
+                    metrics=sink
+                )
+            finally:
+                if sink is not None:
+                    sink.close()
 
             # Store in nested dict
             results[reward_name][state_name] = (total_rewards, lengths)
 
             # Save the Q-table
-            q_table_filename = f"q_tables/q_table_{experiment_key}.pkl"
             agent.save_q_table(q_table_filename)
 
     # 2. Plot results for each reward
     #plot_results(results)
-    plot_results_by_reward(results)
+    if metrics:
+        from plot_metrics import plot_metrics_by_reward
+        plot_metrics_by_reward(metrics_files)
+    else:
+        plot_results_by_reward(results)
     return results
 
 def run_all_experiments2():
@@ -1,13 +1,14 @@
 # run_experiment_sarsa.py
 import numpy as np
 
-import pygame
 import sys
 import matplotlib.pyplot as plt
 import os
 
 from environment import Environment
 from sarsa_agent import SarsaAgent
+from instrumentation import start_profiler, stop_profiler
+from metrics import MetricsSink, metrics_path
 from settings import FPS
 import matplotlib.pyplot as plt
 import os
@@ -15,7 +16,6 @@ from settings import (
     STATE_SPACES, REWARD_SETTINGS, NUM_EPISODES, MAX_STEPS_PER_EPISODE
 )
 from environment import Environment
-import pygame
 import sys
 from environment import Environment
 from settings import (
@@ -24,61 +24,129 @@ from settings import (
 )
 
 
-def run_experiment_sarsa(state_space, rewards, num_episodes=1000, show_game=False):
-    agent = SarsaAgent(state_space=state_space)
+def run_experiment_sarsa(state_space, rewards, num_episodes=1000, show_game=False,
+                         timer=None, profile_path=None, metrics=None, watch=False,
+                         checkpointer=None, agent_class=SarsaAgent):
+    """
+    Trains a SARSA agent.
+
+    Args:
+        timer (PhaseTimer): Optional; accumulates time per phase (env.step,
+            get_state, choose_action, sarsa_update, render). Off by default.
+        profile_path (str): Optional path prefix; the run is wrapped in
+            cProfile and written to <prefix>.prof and <prefix>.folded.
+        metrics (MetricsSink): Optional; every episode is streamed to it and
+            total_rewards / lengths are not kept (they come back empty).
+        watch (bool): Open a window that samples the board at FPS from a
+            separate process while training runs at full speed (see watch.py).
+        checkpointer (Checkpointer): Optional; saves the run periodically and,
+            if it was created with resume=True, continues from its last
+            checkpoint (see checkpoint.py).
+        agent_class: SarsaAgent or a subclass with the same interface
+            (e.g. SarsaLambdaAgent).
+
+    Returns:
+        tuple: (total_rewards, lengths, agent)
+    """
+    agent = agent_class(state_space=state_space)
     env = Environment(rewards=rewards)
+    profiler = start_profiler() if profile_path else None
+    watcher = None
+    if watch:
+        from watch import Watcher
+        watcher = Watcher()
 
     total_rewards = []
     lengths = []
 
     if show_game:
+        # Imported here so that headless training never loads pygame
+        import pygame
         pygame.init()
         screen = pygame.display.set_mode((800, 600))
         clock = pygame.time.Clock()
         font = pygame.font.SysFont("arial", 20)
-
-    for episode in range(1, num_episodes + 1):
+        from rendering import IncrementalRenderer
+        renderer = IncrementalRenderer(screen, font)
+
+        def render(episode):
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    pygame.quit()
+                    sys.exit()
+            renderer.draw(env, episode)
+            clock.tick(FPS)
+
+    # Bound methods are looked up once; with a timer they are wrapped instead
+    step, get_state, choose_action = env.step, agent.get_state, agent.choose_action
+    sarsa_update, sarsa_update_terminal = agent.sarsa_update, agent.sarsa_update_terminal
+    if timer is not None:
+        step = timer.wrap('env.step', step)
+        get_state = timer.wrap('get_state', get_state)
+        choose_action = timer.wrap('choose_action', choose_action)
+        sarsa_update = timer.wrap('sarsa_update', sarsa_update)
+        sarsa_update_terminal = timer.wrap('sarsa_update', sarsa_update_terminal)
+        if show_game:
+            render = timer.wrap('render', render)
+
+    start_episode = 1
+    if checkpointer is not None:
+        start_episode = checkpointer.restore(agent, env, total_rewards, lengths, metrics)
+
+    for episode in range(start_episode, num_episodes + 1):
         env.reset()
 
         # Initial state & action
-        state = agent.get_state(env.snake, env.food)
-        action = agent.choose_action(state)
+        state = get_state(env.snake, env.food)
+        action = choose_action(state)
 
         ep_reward = 0
+        steps = 0
         done = False
 
         while not done:
             # Step in environment
-            reward, done = env.step(action)
-            next_state = agent.get_state(env.snake, env.food)
+            reward, done = step(action)
+            steps += 1
+            next_state = get_state(env.snake, env.food)
 
             if not done:
-                next_action = agent.choose_action(next_state)
+                next_action = choose_action(next_state)
                 # SARSA update
-                agent.sarsa_update(state, action, reward, next_state, next_action)
+                sarsa_update(state, action, reward, next_state, next_action)
                 # Advance state
                 state, action = next_state, next_action
             else:
                 # Terminal update
-                agent.sarsa_update_terminal(state, action, reward)
+                sarsa_update_terminal(state, action, reward)
 
             ep_reward += reward
 
             if show_game:
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT:
-                        pygame.quit()
-                        sys.exit()
-                env.draw(screen, font, episode)
-                pygame.display.update()
-                clock.tick(FPS)
+                render(episode)
+            if watcher is not None:
+                watcher.observe(env, episode)
 
         agent.update_exploration_rate()
-        total_rewards.append(ep_reward)
-        lengths.append(len(env.snake.body))
+        if metrics is not None:
+            metrics.record(episode, ep_reward, env.snake.length, steps,
+                           agent.exploration_rate, len(agent.q_table))
+        else:
+            total_rewards.append(ep_reward)
+            lengths.append(env.snake.length)
+        if checkpointer is not None:
+            checkpointer.maybe_save(episode, agent, env, total_rewards, lengths, metrics)
 
     if show_game:
         pygame.quit()
+    if watcher is not None:
+        watcher.close()
+    if checkpointer is not None:
+        checkpointer.close()
+    if profiler is not None:
+        stop_profiler(profiler, profile_path)
+    if metrics is not None:
+        metrics.flush()
 
     return total_rewards, lengths, agent
 
@@ -166,14 +234,21 @@ def plot_results_by_reward(results, step=30, window_size=50):
         plt.tight_layout()
         plt.show()
 
-def run_all_experiments_sarsa():
+def run_all_experiments_sarsa(metrics=None):
     """
     Runs SARSA training for all combinations of state spaces (S1..S5)
     and rewards (R1..?), collects results, and plots them.
+
+    Args:
+        metrics (str): 'jsonl' or 'csv' to stream per-episode metrics to
+            q_tables_sarsa/*_metrics.<ext> instead of keeping the curves in
+            memory; the plots are then saved from those files instead of
+            being shown.
     """
 
     # results[reward_name][state_name] = (total_rewards, lengths)
     results = {}
+    metrics_files = {reward_name: [] for reward_name in REWARD_SETTINGS}
 
     # Create a directory for Q-tables if you want to save them
     os.makedirs("q_tables_sarsa", exist_ok=True)
@@ -185,22 +260,35 @@ def run_all_experiments_sarsa():
         # 2. For each state space
         for state_name, state_space in STATE_SPACES.items():
             print(f"=== SARSA: Training {state_name} with {reward_name} ===")
+            q_table_filename = f"q_tables_sarsa/sarsa_qtable_{state_name}_{reward_name}.pkl"
+            sink = None
+            if metrics:
+                metrics_files[reward_name].append(metrics_path(q_table_filename, '.' + metrics))
+                sink = MetricsSink(metrics_files[reward_name][-1])
 
             # Run the experiment (no rendering for faster training)
-            total_rewards, lengths, agent = run_experiment_sarsa(
-                state_space=state_space,
-                rewards=rewards,
-                num_episodes=NUM_EPISODES,
-                show_game=False
-            )
+            try:
+                total_rewards, lengths, agent = run_experiment_sarsa(
+                    state_space=state_space,
+                    rewards=rewards,
+                    num_episodes=NUM_EPISODES,
+                    show_game=False,
+                    metrics=sink
+                )
+            finally:
+                if sink is not None:
+                    sink.close()
 
             # Optionally save the SARSA Q-table
-            q_table_filename = f"q_tables_sarsa/sarsa_qtable_{state_name}_{reward_name}.pkl"
             agent.save_q_table(q_table_filename)
 
             # Store results
             results[reward_name][state_name] = (total_rewards, lengths)
 
-    plot_results_by_reward(results)
+    if metrics:
+        from plot_metrics import plot_metrics_by_reward
+        plot_metrics_by_reward(metrics_files)
+    else:
+        plot_results_by_reward(results)
 
     return results
\ No newline at end of file
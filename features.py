@@ -0,0 +1,582 @@
+# features.py
+#
+# State features shared by Agent and SarsaAgent.
+#
+# Every feature name used in settings.STATE_SPACES maps to a registered
+# extractor f(snake, food) -> value. An agent calls compile_state_encoder()
+# once at construction and gets back a single function that builds the
+# whole state tuple; the state spaces S1..S5 have hand-fused encoders so
+# shared work (danger checks, ray walks) is done once per call, and
+# batched NumPy versions that encode many VecEnvironment boards at once.
+
+import numpy as np
+from settings import GRID_WIDTH, GRID_HEIGHT, STATE_1, STATE_2, STATE_3, STATE_4, STATE_5
+from environment import DIRECTION_DELTAS
+
+# name -> f(snake, food)
+FEATURES = {}
+# tuple(state_space) -> fused f(snake, food) returning the full state tuple
+ENCODERS = {}
+
+LEFT_OF = {'UP': 'LEFT', 'LEFT': 'DOWN', 'DOWN': 'RIGHT', 'RIGHT': 'UP'}
+RIGHT_OF = {'UP': 'RIGHT', 'RIGHT': 'DOWN', 'DOWN': 'LEFT', 'LEFT': 'UP'}
+
+# 8 ray directions for S3:
+# 0 = Up, 1 = UpRight, 2 = Right, 3 = DownRight, 4 = Down, 5 = DownLeft, 6 = Left, 7 = UpLeft
+DIRECTIONS_8 = [
+    (0, -1),
+    (1, -1),
+    (1, 0),
+    (1, 1),
+    (0, 1),
+    (-1, 1),
+    (-1, 0),
+    (-1, -1)
+]
+RAY_FEATURES = ['see_body', 'see_wall', 'dist_body', 'dist_food', 'dist_wall']
+
+
+def _build_ray_tables():
+    """
+    For every grid cell and each of DIRECTIONS_8, precomputes
+    (mask, dist_wall, stride, ascending):
+      - mask: bitboard of the cells the ray crosses before the wall
+      - dist_wall: steps until the ray leaves the grid
+      - stride: |cell index change| per step
+      - ascending: True if cell indices grow along the ray, so the nearest
+        set bit is the lowest one (otherwise the highest one)
+    """
+    tables = []
+    for y in range(GRID_HEIGHT):
+        for x in range(GRID_WIDTH):
+            rays = []
+            for dx, dy in DIRECTIONS_8:
+                mask = 0
+                steps = 0
+                cx, cy = x + dx, y + dy
+                while 0 <= cx < GRID_WIDTH and 0 <= cy < GRID_HEIGHT:
+                    mask |= 1 << (cy * GRID_WIDTH + cx)
+                    steps += 1
+                    cx += dx
+                    cy += dy
+                stride = dy * GRID_WIDTH + dx
+                rays.append((mask, steps + 1, abs(stride), stride > 0))
+            tables.append(tuple(rays))
+    return tables
+
+
+# RAY_TABLES[y * GRID_WIDTH + x][direction] -> (mask, dist_wall, stride, ascending)
+RAY_TABLES = _build_ray_tables()
+
+
+def register_feature(name):
+    """Decorator registering `f(snake, food)` as the extractor for `name`."""
+    def decorator(func):
+        FEATURES[name] = func
+        return func
+    return decorator
+
+
+def register_encoder(state_space):
+    """Decorator registering a fused encoder for an exact feature list."""
+    def decorator(func):
+        ENCODERS[tuple(state_space)] = func
+        return func
+    return decorator
+
+
+def compile_state_encoder(state_space):
+    """
+    Builds the state encoder for a feature list.
+
+    Args:
+        state_space (list): Feature names, e.g. STATE_SPACES["S5"].
+
+    Returns:
+        function: encode(snake, food) -> tuple of feature values, in the
+        order of `state_space`.
+    """
+    key = tuple(state_space)
+    if key in ENCODERS:
+        return ENCODERS[key]
+
+    unknown = [name for name in key if name not in FEATURES]
+    if unknown:
+        raise ValueError(f"Unknown state features: {unknown}")
+    extractors = tuple(FEATURES[name] for name in key)
+
+    def encode(snake, food):
+        return tuple(extract(snake, food) for extract in extractors)
+    return encode
+
+
+# -----------
+# HELPER FUNCS
+# -----------
+def sign(value):
+    return (value > 0) - (value < 0)
+
+
+def is_wall(x, y):
+    return int(x < 0 or x >= GRID_WIDTH or y < 0 or y >= GRID_HEIGHT)
+
+
+def is_wall_ahead(snake, direction):
+    """
+    Returns 1 if the next position in `direction` is outside the grid, else 0.
+    """
+    return is_wall(*snake.get_next_position(direction))
+
+
+def is_danger(snake, point):
+    """
+    Danger means either a wall or self-collision.
+    """
+    x, y = point
+    if x < 0 or x >= GRID_WIDTH or y < 0 or y >= GRID_HEIGHT:
+        return 1
+    return int(snake.occupies(x, y))
+
+
+def dangers(snake):
+    """(danger_straight, danger_left, danger_right) for the current direction."""
+    direction = snake.direction
+    return (
+        is_danger(snake, snake.get_next_position(direction)),
+        is_danger(snake, snake.get_next_position(LEFT_OF[direction])),
+        is_danger(snake, snake.get_next_position(RIGHT_OF[direction]))
+    )
+
+
+def scan_ray(cell, ray, body_bits, food_cell):
+    """
+    S3 ray features from the precomputed tables: the nearest body segment
+    is found with a bit scan of `body_bits & mask` instead of walking the
+    ray. Returns (see_body, see_wall, dist_body, dist_food, dist_wall).
+    """
+    mask, dist_wall, stride, ascending = ray
+    hits = body_bits & mask
+    if hits:
+        if ascending:
+            nearest = (hits & -hits).bit_length() - 1
+        else:
+            nearest = hits.bit_length() - 1
+        see_body = 1
+        dist_body = abs(nearest - cell) // stride
+    else:
+        see_body = 0
+        dist_body = 0
+    if (mask >> food_cell) & 1:
+        dist_food = abs(food_cell - cell) // stride
+    else:
+        dist_food = 0
+    return (see_body, 1, dist_body, dist_food, dist_wall)
+
+
+def ray_features(snake, food, direction):
+    """S3 features for one of DIRECTIONS_8 (by index)."""
+    head_x, head_y = snake.head
+    if not (0 <= head_x < GRID_WIDTH and 0 <= head_y < GRID_HEIGHT):
+        # Terminal state after a wall hit: the head is off the tables
+        dx, dy = DIRECTIONS_8[direction]
+        return explore_direction(snake.head, dx, dy, snake, food)
+    cell = head_y * GRID_WIDTH + head_x
+    fx, fy = food.position
+    return scan_ray(cell, RAY_TABLES[cell][direction], snake.occupancy.bits,
+                    fy * GRID_WIDTH + fx)
+
+
+def explore_direction(head, dx, dy, snake, food):
+    """
+    For S3: we step outward from the head along (dx, dy):
+      - see_body: 1 if the ray crosses the snake's body
+      - see_wall: 1 if the ray reaches a wall (always, the ray ends there)
+      - dist_body: how many steps until we see body (0 if we don't see it)
+      - dist_food: how many steps until food (0 if we don't see it)
+      - dist_wall: how many steps until wall
+    We keep stepping until we go outside the grid.
+    """
+    see_body = 0
+    dist_body = 0
+    dist_food = 0
+
+    steps = 0
+    cur_x, cur_y = head
+    food_pos = food.position
+    while True:
+        steps += 1
+        cur_x += dx
+        cur_y += dy
+
+        if (cur_x < 0 or cur_x >= GRID_WIDTH or
+                cur_y < 0 or cur_y >= GRID_HEIGHT):
+            return (see_body, 1, dist_body, dist_food, steps)
+
+        if see_body == 0 and snake.occupies(cur_x, cur_y):
+            see_body = 1
+            dist_body = steps
+
+        if dist_food == 0 and (cur_x, cur_y) == food_pos:
+            dist_food = steps
+
+
+# -----------------------------
+# Per-feature extractors
+# -----------------------------
+@register_feature('wall_straight')
+def wall_straight(snake, food):
+    return is_wall_ahead(snake, snake.direction)
+
+
+@register_feature('wall_left')
+def wall_left(snake, food):
+    return is_wall_ahead(snake, LEFT_OF[snake.direction])
+
+
+@register_feature('wall_right')
+def wall_right(snake, food):
+    return is_wall_ahead(snake, RIGHT_OF[snake.direction])
+
+
+@register_feature('relative_food')
+def relative_food(snake, food):
+    head_x, head_y = snake.head
+    fx, fy = food.position
+    return (sign(fx - head_x), sign(fy - head_y))
+
+
+@register_feature('relative_tail')
+def relative_tail(snake, food):
+    head_x, head_y = snake.head
+    tail_x, tail_y = snake.tail
+    return (sign(tail_x - head_x), sign(tail_y - head_y))
+
+
+@register_feature('danger_straight')
+def danger_straight(snake, food):
+    return is_danger(snake, snake.get_next_position(snake.direction))
+
+
+@register_feature('danger_left')
+def danger_left(snake, food):
+    return is_danger(snake, snake.get_next_position(LEFT_OF[snake.direction]))
+
+
+@register_feature('danger_right')
+def danger_right(snake, food):
+    return is_danger(snake, snake.get_next_position(RIGHT_OF[snake.direction]))
+
+
+def _register_direction(name, direction):
+    FEATURES[name] = lambda snake, food: int(snake.direction == direction)
+
+
+for _direction in ('UP', 'DOWN', 'LEFT', 'RIGHT'):
+    _register_direction(f'moving_{_direction.lower()}', _direction)
+    _register_direction(f'snake_direction_{_direction.lower()}', _direction)
+
+
+@register_feature('food_left')
+def food_left(snake, food):
+    return int(food.position[0] < snake.head[0])
+
+
+@register_feature('food_up')
+def food_up(snake, food):
+    return int(food.position[1] < snake.head[1])
+
+
+@register_feature('food_down')
+def food_down(snake, food):
+    return int(food.position[1] > snake.head[1])
+
+
+@register_feature('food_direction_x')
+def food_direction_x(snake, food):
+    return sign(food.position[0] - snake.head[0])
+
+
+@register_feature('food_direction_y')
+def food_direction_y(snake, food):
+    return sign(food.position[1] - snake.head[1])
+
+
+@register_feature('food_dist_x')
+def food_dist_x(snake, food):
+    return abs(food.position[0] - snake.head[0])
+
+
+@register_feature('food_dist_y')
+def food_dist_y(snake, food):
+    return abs(food.position[1] - snake.head[1])
+
+
+@register_feature('wall_dist_up')
+def wall_dist_up(snake, food):
+    return snake.head[1]
+
+
+@register_feature('wall_dist_down')
+def wall_dist_down(snake, food):
+    return GRID_HEIGHT - snake.head[1]
+
+
+@register_feature('wall_dist_left')
+def wall_dist_left(snake, food):
+    return snake.head[0]
+
+
+@register_feature('wall_dist_right')
+def wall_dist_right(snake, food):
+    return GRID_WIDTH - snake.head[0]
+
+
+def _register_ray(index, field):
+    field_pos = RAY_FEATURES.index(field)
+    FEATURES[f'dir{index}_{field}'] = (
+        lambda snake, food: ray_features(snake, food, index)[field_pos])
+
+
+for _i in range(8):
+    for _field in RAY_FEATURES:
+        _register_ray(_i, _field)
+
+
+# -----------------------------
+# Fused encoders for S1..S5
+# -----------------------------
+@register_encoder(STATE_1)
+def encode_s1(snake, food):
+    """(ws, wl, wr, qf, qt): walls straight/left/right, food and tail offsets."""
+    head_x, head_y = snake.head
+    direction = snake.direction
+    fx, fy = food.position
+    tail_x, tail_y = snake.tail
+    return (
+        is_wall_ahead(snake, direction),
+        is_wall_ahead(snake, LEFT_OF[direction]),
+        is_wall_ahead(snake, RIGHT_OF[direction]),
+        (sign(fx - head_x), sign(fy - head_y)),
+        (sign(tail_x - head_x), sign(tail_y - head_y))
+    )
+
+
+@register_encoder(STATE_2)
+def encode_s2(snake, food):
+    """Dangers, moving direction one-hot and food_left/up/down flags."""
+    head_x, head_y = snake.head
+    direction = snake.direction
+    fx, fy = food.position
+    return dangers(snake) + (
+        int(direction == 'LEFT'),
+        int(direction == 'RIGHT'),
+        int(direction == 'UP'),
+        int(direction == 'DOWN'),
+        int(fx < head_x),
+        int(fy < head_y),
+        int(fy > head_y)
+    )
+
+
+@register_encoder(STATE_3)
+def encode_s3(snake, food):
+    """5 ray features for each of the 8 directions (40 values)."""
+    head_x, head_y = snake.head
+    features = ()
+    if not (0 <= head_x < GRID_WIDTH and 0 <= head_y < GRID_HEIGHT):
+        # Terminal state after a wall hit: walk the rays instead
+        for dx, dy in DIRECTIONS_8:
+            features += explore_direction(snake.head, dx, dy, snake, food)
+        return features
+
+    cell = head_y * GRID_WIDTH + head_x
+    fx, fy = food.position
+    food_cell = fy * GRID_WIDTH + fx
+    body_bits = snake.occupancy.bits
+    for ray in RAY_TABLES[cell]:
+        features += scan_ray(cell, ray, body_bits, food_cell)
+    return features
+
+
+@register_encoder(STATE_4)
+def encode_s4(snake, food):
+    """Dangers, direction one-hot, food distance and wall distances in tiles."""
+    head_x, head_y = snake.head
+    direction = snake.direction
+    fx, fy = food.position
+    return dangers(snake) + (
+        int(direction == 'UP'),
+        int(direction == 'DOWN'),
+        int(direction == 'LEFT'),
+        int(direction == 'RIGHT'),
+        abs(fx - head_x),
+        abs(fy - head_y),
+        head_y,
+        GRID_HEIGHT - head_y,
+        head_x,
+        GRID_WIDTH - head_x
+    )
+
+
+@register_encoder(STATE_5)
+def encode_s5(snake, food):
+    """Dangers, direction one-hot and the sign of the food offset in x, y."""
+    head_x, head_y = snake.head
+    direction = snake.direction
+    fx, fy = food.position
+    return dangers(snake) + (
+        int(direction == 'LEFT'),
+        int(direction == 'RIGHT'),
+        int(direction == 'UP'),
+        int(direction == 'DOWN'),
+        sign(fx - head_x),
+        sign(fy - head_y)
+    )
+
+
+# -----------------------------
+# Batched encoders (N boards at once)
+# -----------------------------
+# Inputs follow VecEnvironment: heads/food/tails are (N, 2) integer cell
+# arrays, directions are (N,) indices into environment.DIRECTIONS
+# ('UP', 'RIGHT', 'DOWN', 'LEFT') and occupancy is an (N, GRID_HEIGHT,
+# GRID_WIDTH) bool array. Outputs are (N, columns) int64 arrays whose
+# columns match the state tuples above, with tuple-valued features
+# (relative_food, relative_tail) flattened to x, y columns.
+
+# tuple(state_space) -> f(heads, directions, food, occupancy, tails)
+BATCH_ENCODERS = {}
+
+# Name -> index into environment.DIRECTIONS, used for the one-hot columns
+_DIRECTION_INDEX = {'UP': 0, 'RIGHT': 1, 'DOWN': 2, 'LEFT': 3}
+
+
+def register_batch_encoder(state_space):
+    """Decorator registering a batched encoder for an exact feature list."""
+    def decorator(func):
+        BATCH_ENCODERS[tuple(state_space)] = func
+        return func
+    return decorator
+
+
+def compile_batch_encoder(state_space):
+    """
+    Returns encode(heads, directions, food, occupancy, tails) -> (N, columns)
+    for one of the S1..S5 feature lists.
+    """
+    key = tuple(state_space)
+    if key not in BATCH_ENCODERS:
+        raise ValueError("No batched encoder for this state space")
+    return BATCH_ENCODERS[key]
+
+
+def encode_vec_env(encode_batch, vec_env):
+    """Applies a batched encoder to the current boards of a VecEnvironment."""
+    return encode_batch(vec_env.heads, vec_env.directions, vec_env.food,
+                        vec_env.occupancy, vec_env.tails())
+
+
+def _out_of_grid(x, y):
+    return (x < 0) | (x >= GRID_WIDTH) | (y < 0) | (y >= GRID_HEIGHT)
+
+
+def _occupied(occupancy, x, y):
+    """occupancy[i, y[i], x[i]] with cells outside the grid reading False."""
+    inside = ~_out_of_grid(x, y)
+    hit = np.zeros(len(x), dtype=bool)
+    rows = np.flatnonzero(inside)
+    hit[rows] = occupancy[rows, y[rows], x[rows]]
+    return hit
+
+
+def _next_cells(heads, directions, turn):
+    moved = (directions + turn) % 4
+    deltas = DIRECTION_DELTAS[moved]
+    return heads[:, 0] + deltas[:, 0], heads[:, 1] + deltas[:, 1]
+
+
+def batch_walls(heads, directions):
+    """(N, 3) wall flags for straight, left, right."""
+    return np.stack([_out_of_grid(*_next_cells(heads, directions, turn))
+                     for turn in (0, -1, 1)], axis=1).astype(np.int64)
+
+
+def batch_dangers(heads, directions, occupancy):
+    """(N, 3) danger flags (wall or body) for straight, left, right."""
+    columns = []
+    for turn in (0, -1, 1):
+        x, y = _next_cells(heads, directions, turn)
+        columns.append(_out_of_grid(x, y) | _occupied(occupancy, x, y))
+    return np.stack(columns, axis=1).astype(np.int64)
+
+
+def batch_one_hot(directions, order):
+    """(N, len(order)) one-hot direction columns in the given name order."""
+    return np.stack([directions == _DIRECTION_INDEX[name] for name in order],
+                    axis=1).astype(np.int64)
+
+
+@register_batch_encoder(STATE_1)
+def encode_batch_s1(heads, directions, food, occupancy, tails):
+    return np.concatenate([
+        batch_walls(heads, directions),
+        np.sign(food - heads),
+        np.sign(tails - heads)
+    ], axis=1).astype(np.int64)
+
+
+@register_batch_encoder(STATE_2)
+def encode_batch_s2(heads, directions, food, occupancy, tails=None):
+    return np.concatenate([
+        batch_dangers(heads, directions, occupancy),
+        batch_one_hot(directions, ('LEFT', 'RIGHT', 'UP', 'DOWN')),
+        np.stack([food[:, 0] < heads[:, 0],
+                  food[:, 1] < heads[:, 1],
+                  food[:, 1] > heads[:, 1]], axis=1)
+    ], axis=1).astype(np.int64)
+
+
+@register_batch_encoder(STATE_3)
+def encode_batch_s3(heads, directions, food, occupancy, tails=None):
+    n = len(heads)
+    features = np.zeros((n, 8, 5), dtype=np.int64)
+    features[:, :, 1] = 1  # see_wall: every ray ends at a wall
+    max_steps = max(GRID_WIDTH, GRID_HEIGHT) + 1
+    for d, (dx, dy) in enumerate(DIRECTIONS_8):
+        active = np.ones(n, dtype=bool)
+        for steps in range(1, max_steps + 1):
+            x = heads[:, 0] + dx * steps
+            y = heads[:, 1] + dy * steps
+            wall = active & _out_of_grid(x, y)
+            features[wall, d, 4] = steps
+            active &= ~wall
+            if not active.any():
+                break
+            body = active & _occupied(occupancy, x, y) & (features[:, d, 0] == 0)
+            features[body, d, 0] = 1
+            features[body, d, 2] = steps
+            at_food = active & (x == food[:, 0]) & (y == food[:, 1]) & (features[:, d, 3] == 0)
+            features[at_food, d, 3] = steps
+    return features.reshape(n, 40)
+
+
+@register_batch_encoder(STATE_4)
+def encode_batch_s4(heads, directions, food, occupancy, tails=None):
+    return np.concatenate([
+        batch_dangers(heads, directions, occupancy),
+        batch_one_hot(directions, ('UP', 'DOWN', 'LEFT', 'RIGHT')),
+        np.abs(food - heads),
+        np.stack([heads[:, 1],
+                  GRID_HEIGHT - heads[:, 1],
+                  heads[:, 0],
+                  GRID_WIDTH - heads[:, 0]], axis=1)
+    ], axis=1).astype(np.int64)
+
+
+@register_batch_encoder(STATE_5)
+def encode_batch_s5(heads, directions, food, occupancy, tails=None):
+    return np.concatenate([
+        batch_dangers(heads, directions, occupancy),
+        batch_one_hot(directions, ('LEFT', 'RIGHT', 'UP', 'DOWN')),
+        np.sign(food - heads)
+    ], axis=1).astype(np.int64)
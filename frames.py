@@ -0,0 +1,160 @@
+# frames.py
+#
+# Headless rendering of the board into NumPy arrays; no pygame or display
+# needed. A board is first rasterized at one byte per grid cell into palette
+# indices (see PALETTE), then scaled to `cell_size` pixels per cell and
+# looked up in the palette to give an (H, W, 3) uint8 RGB frame. Colours and
+# draw order (body, head, food) follow rendering.py.
+#
+# Usage:
+#   python frames.py --qtable q_tables/q_table_S5_R1.pkl --agent_type Q --episodes 3 --output frames.npz
+
+import argparse
+import numpy as np
+from settings import GRID_WIDTH, GRID_HEIGHT, TILE_SIZE, COLORS
+
+# Palette indices
+BACKGROUND, BODY, HEAD, FOOD, GRID_LINE = range(5)
+PALETTE = np.array([
+    COLORS['black'],
+    COLORS['green'],
+    COLORS['dark_green'],
+    COLORS['red'],
+    COLORS['light_gray'],
+], dtype=np.uint8)
+
+
+class FrameRenderer:
+    def __init__(self, cell_size=TILE_SIZE, grid_lines=True):
+        """
+        Args:
+            cell_size (int): Pixels per grid cell.
+            grid_lines (bool): Draw the grid lines of rendering.draw_grid on
+                background pixels.
+        """
+        self.cell_size = cell_size
+        self.grid_lines = grid_lines
+
+    # -----------------------------
+    # Palette grids (one byte per cell)
+    # -----------------------------
+    def palette(self, snake, food, out=None):
+        """(GRID_HEIGHT, GRID_WIDTH) uint8 palette indices for one board."""
+        grid = out if out is not None else np.empty((GRID_HEIGHT, GRID_WIDTH), dtype=np.uint8)
+        grid.fill(BACKGROUND)
+        body = np.array(snake.body, dtype=np.int64).reshape(-1, 2)
+        inside = ((body[:, 0] >= 0) & (body[:, 0] < GRID_WIDTH) &
+                  (body[:, 1] >= 0) & (body[:, 1] < GRID_HEIGHT))
+        grid[body[inside, 1], body[inside, 0]] = BODY
+        if inside[0]:
+            grid[body[0, 1], body[0, 0]] = HEAD
+        fx, fy = food.position
+        grid[fy, fx] = FOOD
+        return grid
+
+    def palette_batch(self, vec_env):
+        """(N, GRID_HEIGHT, GRID_WIDTH) uint8 palette indices for a VecEnvironment."""
+        grids = vec_env.occupancy.astype(np.uint8)  # BODY == 1
+        heads = vec_env.heads
+        inside = ((heads[:, 0] >= 0) & (heads[:, 0] < GRID_WIDTH) &
+                  (heads[:, 1] >= 0) & (heads[:, 1] < GRID_HEIGHT))
+        boards = np.flatnonzero(inside)
+        grids[boards, heads[boards, 1], heads[boards, 0]] = HEAD
+        boards = np.arange(len(grids))
+        grids[boards, vec_env.food[:, 1], vec_env.food[:, 0]] = FOOD
+        return grids
+
+    # -----------------------------
+    # RGB frames
+    # -----------------------------
+    def to_rgb(self, grids):
+        """
+        Scales palette grids ((H, W) or (N, H, W)) to RGB frames of shape
+        (..., H * cell_size, W * cell_size, 3).
+        """
+        cs = self.cell_size
+        lead = grids.shape[:-2]
+        colors = PALETTE[grids]
+        # View the frame as (..., H, cs, W, cs, 3) and fill it by broadcasting
+        frame = np.empty(lead + (GRID_HEIGHT, cs, GRID_WIDTH, cs, 3), dtype=np.uint8)
+        frame[...] = colors[..., :, None, :, None, :]
+        if self.grid_lines:
+            # The first pixel row / column of each cell is a grid line unless
+            # something is drawn on the cell
+            line_colors = np.where((grids == BACKGROUND)[..., None], PALETTE[GRID_LINE], colors)
+            frame[..., :, 0, :, :, :] = line_colors[..., :, :, None, :]
+            frame[..., :, :, :, 0, :] = line_colors[..., :, None, :, :]
+        return frame.reshape(lead + (GRID_HEIGHT * cs, GRID_WIDTH * cs, 3))
+
+    def render(self, snake, food):
+        return self.to_rgb(self.palette(snake, food))
+
+    def render_env(self, env):
+        return self.render(env.snake, env.food)
+
+    def render_batch(self, vec_env):
+        return self.to_rgb(self.palette_batch(vec_env))
+
+
+def save_frames(path, grids, cell_size=TILE_SIZE):
+    """
+    Stores a frame sequence compactly as palette grids (one byte per cell)
+    plus the palette; expand with FrameRenderer(cell_size).to_rgb(grids).
+    """
+    np.savez_compressed(path, grids=np.asarray(grids, dtype=np.uint8),
+                        palette=PALETTE, cell_size=cell_size)
+
+
+def load_frames(path):
+    """Returns (grids, palette, cell_size) from a save_frames file."""
+    with np.load(path) as data:
+        return data['grids'], data['palette'], int(data['cell_size'])
+
+
+def record_episodes(agent, env, renderer, episodes=1, max_steps=None):
+    """
+    Plays `episodes` episodes and returns their palette grids stacked into
+    one (frames, GRID_HEIGHT, GRID_WIDTH) array, first frame after reset.
+    """
+    grids = []
+    for _ in range(episodes):
+        env.reset()
+        state = agent.get_state(env.snake, env.food)
+        grids.append(renderer.palette(env.snake, env.food))
+        done = False
+        steps = 0
+        while not done and (max_steps is None or steps < max_steps):
+            reward, done = env.step(agent.choose_action(state))
+            state = agent.get_state(env.snake, env.food)
+            grids.append(renderer.palette(env.snake, env.food))
+            steps += 1
+    return np.stack(grids)
+
+
+if __name__ == '__main__':
+    from agent import Agent
+    from sarsa_agent import SarsaAgent
+    from environment import Environment
+    from qtable_io import parse_state_reward
+    from settings import STATE_SPACES, REWARD_SETTINGS, MAX_STEPS_PER_EPISODE
+
+    parser = argparse.ArgumentParser(description="Record a trained agent's episodes as frames, without a display.")
+    parser.add_argument('--qtable', required=True, help="Q-table file (.pkl or .qtb)")
+    parser.add_argument('--agent_type', default='Q', help="'Q' or 'SARSA'")
+    parser.add_argument('--episodes', type=int, default=1, help="Episodes to record")
+    parser.add_argument('--cell-size', type=int, default=TILE_SIZE, help="Pixels per grid cell")
+    parser.add_argument('--output', default='frames.npz', help="Output .npz (palette grids)")
+    args = parser.parse_args()
+
+    state_name, reward_name = parse_state_reward(args.qtable)
+    if not state_name:
+        raise ValueError(f"Unable to parse state or reward from filename: {args.qtable}")
+    agent_class = SarsaAgent if args.agent_type.upper() == 'SARSA' else Agent
+    agent = agent_class(state_space=STATE_SPACES[state_name], exploration_rate=0.0)
+    agent.load_q_table(args.qtable)
+
+    renderer = FrameRenderer(args.cell_size)
+    grids = record_episodes(agent, Environment(REWARD_SETTINGS[reward_name]), renderer,
+                            args.episodes, MAX_STEPS_PER_EPISODE)
+    save_frames(args.output, grids, args.cell_size)
+    print(f"{len(grids)} frames saved to {args.output}")
@@ -0,0 +1,214 @@
+# grid_runner.py
+#
+# Trains every STATE_SPACES x REWARD_SETTINGS combination concurrently in a
+# process pool. Each job seeds `random` and NumPy from (seed, state, reward),
+# so a parallel run gives exactly the same Q-tables and curves as a serial
+# run (--workers 1) with the same --seed.
+#
+# Usage:
+#   python grid_runner.py --algorithm q --workers 4
+#   python grid_runner.py --algorithm sarsa --workers 8 --episodes 500 --no-plot
+#   python grid_runner.py --algorithm sarsalambda --workers 8 --episodes 500
+#   python grid_runner.py --workers 4 --episodes 200 --no-plot --instrument --profile
+#   python grid_runner.py --workers 8 --episodes 1000000 --metrics jsonl
+#   python grid_runner.py --workers 8 --checkpoint-every 100 --checkpoint-seconds 300
+#   python grid_runner.py --workers 8 --checkpoint-every 100 --resume     (after a crash)
+
+import argparse
+import json
+import os
+import random
+import zlib
+from functools import partial
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from settings import STATE_SPACES, REWARD_SETTINGS, NUM_EPISODES
+from instrumentation import PhaseTimer, timing_path
+from metrics import MetricsSink, metrics_path
+from checkpoint import Checkpointer, checkpoint_path
+
+
+def _algorithm(name):
+    """
+    Returns (run_fn, plot_fn, q_table_dir, q_table_filename_pattern).
+    Imported lazily so workers only load what they need.
+    """
+    if name == 'q':
+        from experiments import run_experiment, plot_results_by_reward
+        return run_experiment, plot_results_by_reward, "q_tables", "q_table_{state}_{reward}.pkl"
+    if name == 'sarsa':
+        from experiments_sarsa import run_experiment_sarsa, plot_results_by_reward
+        return (run_experiment_sarsa, plot_results_by_reward, "q_tables_sarsa",
+                "sarsa_qtable_{state}_{reward}.pkl")
+    if name == 'qlambda':
+        from experiments import run_experiment, plot_results_by_reward
+        from agent import QLambdaAgent
+        return (partial(run_experiment, agent_class=QLambdaAgent), plot_results_by_reward,
+                "q_tables_qlambda", "qlambda_table_{state}_{reward}.pkl")
+    if name == 'sarsalambda':
+        from experiments_sarsa import run_experiment_sarsa, plot_results_by_reward
+        from sarsa_agent import SarsaLambdaAgent
+        return (partial(run_experiment_sarsa, agent_class=SarsaLambdaAgent), plot_results_by_reward,
+                "q_tables_sarsa_lambda", "sarsa_lambda_qtable_{state}_{reward}.pkl")
+    raise ValueError(f"Unknown algorithm: {name} (expected 'q', 'sarsa', 'qlambda' or 'sarsalambda')")
+
+
+def job_seed(base_seed, state_name, reward_name):
+    """Deterministic per-job seed, independent of scheduling order."""
+    return zlib.crc32(f"{base_seed}_{state_name}_{reward_name}".encode())
+
+
+def grid_jobs():
+    """All (state, reward) pairs in the order run_all_experiments visits them."""
+    return [(state_name, reward_name)
+            for reward_name in REWARD_SETTINGS
+            for state_name in STATE_SPACES]
+
+
+def run_job(algorithm, state_name, reward_name, num_episodes, seed, instrument=False, profile=False,
+            metrics=None, checkpoint=None):
+    """
+    Trains one combination and saves its Q-table. With `instrument` a
+    per-phase timing summary is written next to it (*_timings.json); with
+    `profile` the run is also profiled into *.prof and *.folded. With
+    `metrics` ('jsonl' or 'csv') episodes are streamed to *_metrics.<ext>
+    and the returned curves are empty. `checkpoint` is a dict of Checkpointer
+    arguments (every_episodes, every_seconds, resume); the checkpoint file
+    is *.ckpt next to the Q-table.
+
+    Returns:
+        tuple: (state_name, reward_name, total_rewards, lengths, q_table_path)
+    """
+    run_fn, _, q_table_dir, pattern = _algorithm(algorithm)
+    random.seed(seed)
+    np.random.seed(seed)
+
+    os.makedirs(q_table_dir, exist_ok=True)
+    q_table_path = os.path.join(q_table_dir, pattern.format(state=state_name, reward=reward_name))
+    timer = PhaseTimer() if instrument else None
+    resume = bool(checkpoint and checkpoint.get('resume'))
+    sink = MetricsSink(metrics_path(q_table_path, '.' + metrics), append=resume) if metrics else None
+    checkpointer = Checkpointer(checkpoint_path(q_table_path), **checkpoint) if checkpoint else None
+
+    try:
+        total_rewards, lengths, agent = run_fn(
+            state_space=STATE_SPACES[state_name],
+            rewards=REWARD_SETTINGS[reward_name],
+            num_episodes=num_episodes,
+            show_game=False,
+            timer=timer,
+            profile_path=os.path.splitext(q_table_path)[0] if profile else None,
+            metrics=sink,
+            checkpointer=checkpointer
+        )
+    finally:
+        if sink is not None:
+            sink.close()
+
+    agent.save_q_table(q_table_path)
+    if timer is not None:
+        timer.save(timing_path(q_table_path))
+    return state_name, reward_name, total_rewards, lengths, q_table_path
+
+
+def save_curves(q_table_path, total_rewards, lengths):
+    """Writes the per-episode curves next to the Q-table as JSON."""
+    curves_path = os.path.splitext(q_table_path)[0] + "_curves.json"
+    with open(curves_path, 'w') as f:
+        json.dump({"total_rewards": list(total_rewards), "lengths": list(lengths)}, f)
+    return curves_path
+
+
+def run_grid(algorithm='q', workers=None, num_episodes=NUM_EPISODES, seed=0, plot=True,
+             instrument=False, profile=False, metrics=None, checkpoint=None):
+    """
+    Runs the whole state/reward grid.
+
+    Args:
+        algorithm (str): 'q' (Q-learning), 'sarsa', or their eligibility-trace
+            variants 'qlambda' (Watkins's Q(lambda)) and 'sarsalambda'.
+        workers (int): Worker processes; None uses os.cpu_count(), 1 runs serially
+            in this process.
+        num_episodes (int): Training episodes per combination.
+        seed (int): Base seed; each job derives its own seed from it.
+        plot (bool): Produce the per-reward plots once all jobs finished.
+        instrument (bool): Write a *_timings.json phase summary per job.
+        profile (bool): Profile each job with cProfile (*.prof, *.folded).
+        metrics (str): 'jsonl' or 'csv' to stream per-episode metrics to
+            files instead of collecting curves in memory; the plots are then
+            made from those files (see plot_metrics.py).
+        checkpoint (dict): Checkpointer arguments for every job, e.g.
+            {'every_episodes': 100, 'every_seconds': 300, 'resume': True}.
+
+    Returns:
+        dict: results[reward_name][state_name] = (total_rewards, lengths),
+        ordered like a serial run.
+    """
+    _, plot_fn, _, _ = _algorithm(algorithm)
+    jobs = grid_jobs()
+    finished = {}
+    metrics_files = {reward_name: [] for reward_name in REWARD_SETTINGS}
+
+    def collect(state_name, reward_name, total_rewards, lengths, q_table_path):
+        if metrics:
+            metrics_files[reward_name].append(metrics_path(q_table_path, '.' + metrics))
+        else:
+            save_curves(q_table_path, total_rewards, lengths)
+        finished[(state_name, reward_name)] = (total_rewards, lengths)
+        print(f"=== Finished {state_name}_{reward_name} ({len(finished)}/{len(jobs)}) ===")
+
+    if workers == 1:
+        for state_name, reward_name in jobs:
+            collect(*run_job(algorithm, state_name, reward_name, num_episodes,
+                             job_seed(seed, state_name, reward_name), instrument, profile, metrics,
+                             checkpoint))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(run_job, algorithm, state_name, reward_name, num_episodes,
+                            job_seed(seed, state_name, reward_name), instrument, profile, metrics,
+                            checkpoint)
+                for state_name, reward_name in jobs
+            ]
+            for future in as_completed(futures):
+                collect(*future.result())
+
+    results = {reward_name: {} for reward_name in REWARD_SETTINGS}
+    for state_name, reward_name in jobs:
+        results[reward_name][state_name] = finished[(state_name, reward_name)]
+
+    if plot and metrics:
+        from plot_metrics import plot_metrics_by_reward
+        plot_metrics_by_reward(metrics_files)
+    elif plot:
+        plot_fn(results)
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train all state/reward combinations in parallel.")
+    parser.add_argument('--algorithm', choices=['q', 'sarsa', 'qlambda', 'sarsalambda'], default='q',
+                        help="Learning algorithm")
+    parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: all cores, 1 = serial)")
+    parser.add_argument('--episodes', type=int, default=NUM_EPISODES, help="Episodes per combination")
+    parser.add_argument('--seed', type=int, default=0, help="Base seed for the per-job seeds")
+    parser.add_argument('--no-plot', action='store_true', help="Skip the plots at the end")
+    parser.add_argument('--instrument', action='store_true', help="Write per-phase timings next to each Q-table")
+    parser.add_argument('--profile', action='store_true', help="Profile each job (writes .prof and .folded files)")
+    parser.add_argument('--metrics', choices=['jsonl', 'csv'], default=None,
+                        help="Stream per-episode metrics next to each Q-table instead of keeping curves in memory")
+    parser.add_argument('--checkpoint-every', type=int, default=None, help="Checkpoint every N episodes")
+    parser.add_argument('--checkpoint-seconds', type=float, default=None, help="Checkpoint at least every T seconds")
+    parser.add_argument('--resume', action='store_true', help="Continue each job from its last checkpoint")
+
+    args = parser.parse_args()
+    checkpoint = None
+    if args.checkpoint_every or args.checkpoint_seconds or args.resume:
+        checkpoint = {'every_seconds': args.checkpoint_seconds, 'resume': args.resume}
+        # --resume alone keeps Checkpointer's default interval; --checkpoint-seconds
+        # alone checkpoints on time only
+        if args.checkpoint_every or args.checkpoint_seconds:
+            checkpoint['every_episodes'] = args.checkpoint_every
+    run_grid(algorithm=args.algorithm, workers=args.workers, num_episodes=args.episodes,
+             seed=args.seed, plot=not args.no_plot, instrument=args.instrument, profile=args.profile,
+             metrics=args.metrics, checkpoint=checkpoint)
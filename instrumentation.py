@@ -0,0 +1,131 @@
+# instrumentation.py
+#
+# Opt-in timing for the training loops. A PhaseTimer wraps the callables a
+# loop uses (env.step, agent.get_state, ...) and accumulates wall time and
+# call counts per phase; when no timer is passed the loops call the original
+# bound methods, so the cost is zero when instrumentation is off.
+#
+# The cProfile helpers dump a regular .prof file (for pstats / snakeviz) and
+# a collapsed-stack .folded file ("caller;callee microseconds" per line) that
+# flamegraph.pl and speedscope can read.
+
+import cProfile
+import json
+import os
+import pstats
+import time
+from collections import defaultdict
+
+
+class PhaseTimer:
+    def __init__(self):
+        """Per-phase wall time (seconds) and call counts for one run."""
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.started = time.perf_counter()
+
+    def wrap(self, name, fn):
+        """
+        Returns a function that calls `fn` and charges its wall time to
+        phase `name`.
+        """
+        seconds = self.seconds
+        calls = self.calls
+        clock = time.perf_counter
+
+        def timed(*args):
+            start = clock()
+            try:
+                return fn(*args)
+            finally:
+                seconds[name] += clock() - start
+                calls[name] += 1
+        return timed
+
+    def summary(self):
+        """
+        Returns:
+            dict: {"wall_seconds": ..., "phases": {name: {"seconds", "calls",
+            "mean_us", "share"}}} with an "other" phase for loop overhead.
+        """
+        wall = time.perf_counter() - self.started
+        phases = {}
+        for name, seconds in sorted(self.seconds.items(), key=lambda kv: -kv[1]):
+            calls = self.calls[name]
+            phases[name] = {
+                "seconds": seconds,
+                "calls": calls,
+                "mean_us": seconds / calls * 1e6 if calls else 0.0,
+                "share": seconds / wall if wall else 0.0,
+            }
+        other = wall - sum(self.seconds.values())
+        phases["other"] = {"seconds": other, "calls": 0, "mean_us": 0.0,
+                           "share": other / wall if wall else 0.0}
+        return {"wall_seconds": wall, "phases": phases}
+
+    def save(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.summary(), f, indent=2)
+        return path
+
+    def report(self):
+        """Human-readable table of the summary."""
+        summary = self.summary()
+        lines = [f"{'phase':<24} {'seconds':>9} {'calls':>10} {'mean us':>9} {'share':>7}"]
+        for name, p in summary["phases"].items():
+            lines.append(f"{name:<24} {p['seconds']:>9.3f} {p['calls']:>10} "
+                         f"{p['mean_us']:>9.2f} {p['share']:>6.1%}")
+        lines.append(f"{'total':<24} {summary['wall_seconds']:>9.3f}")
+        return "\n".join(lines)
+
+
+def timing_path(q_table_path):
+    """Where the timing summary of a run goes: next to its Q-table."""
+    return os.path.splitext(q_table_path)[0] + "_timings.json"
+
+
+# -----------------------------
+# cProfile
+# -----------------------------
+def start_profiler():
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def write_collapsed(stats, path):
+    """
+    Writes cProfile caller->callee edges as collapsed stacks. cProfile only
+    records one level of callers, so each line is a two-frame stack
+    weighted by the callee's own time (tottime) under that caller; every
+    microsecond is counted once, so the stacks sum to the profiled runtime.
+    """
+    def label(func):
+        filename, line, name = func
+        return f"{name} ({os.path.basename(filename)}:{line})"
+
+    with open(path, 'w') as f:
+        for callee, (_, _, own_time, _, callers) in stats.stats.items():
+            # Zero-weight stacks only clutter the flame graph
+            root_micros = int(own_time * 1e6)
+            if not callers and root_micros:
+                f.write(f"{label(callee)} {root_micros}\n")
+            for caller, (_, _, edge_time, _) in callers.items():
+                micros = int(edge_time * 1e6)
+                if micros:
+                    f.write(f"{label(caller)};{label(callee)} {micros}\n")
+
+
+def stop_profiler(profiler, path_prefix):
+    """
+    Stops `profiler` and writes <path_prefix>.prof and <path_prefix>.folded.
+
+    Returns:
+        tuple: (prof_path, folded_path)
+    """
+    profiler.disable()
+    prof_path = path_prefix + ".prof"
+    folded_path = path_prefix + ".folded"
+    profiler.dump_stats(prof_path)
+    write_collapsed(pstats.Stats(profiler), folded_path)
+    return prof_path, folded_path
@@ -6,6 +6,7 @@ from settings import SCREEN_WIDTH, SCREEN_HEIGHT, FONT_NAME, FONT_SIZE, FPS
 from settings import STATE_SPACES, REWARD_SETTINGS, NUM_EPISODES
 
 from environment import Environment
+from rendering import IncrementalRenderer
 from agent import Agent
 from experiments import run_all_experiments, run_all_experiments2
 from experiments_sarsa import run_all_experiments_sarsa
@@ -20,6 +21,7 @@ def interactive_play():
     pygame.display.set_caption('Snake Game - Interactive Play')
     clock = pygame.time.Clock()
     font = pygame.font.SysFont(FONT_NAME, FONT_SIZE)
+    renderer = IncrementalRenderer(screen, font)
 
     # Just load a Q-table if you want your agent to use the learned behavior
     # agent = Agent(state_space=STATE_SPACES["advanced"])  # or "basic", "danger_only"
@@ -41,8 +43,7 @@ def interactive_play():
         _, done = env.step(action)
 
         # Render
-        env.draw(screen, font, episode)
-        pygame.display.update()
+        renderer.draw(env, episode)
         clock.tick(FPS)
 
         if done:
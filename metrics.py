@@ -0,0 +1,104 @@
+# metrics.py
+#
+# Streaming per-episode training metrics. The training loops hand each
+# finished episode to a MetricsSink, which buffers a few hundred records and
+# appends them to a JSONL or CSV file, so memory stays constant however many
+# episodes run and the file can be tailed (or plotted with plot_metrics.py)
+# while training is still going.
+
+import csv
+import json
+import os
+import time
+
+METRIC_FIELDS = ('episode', 'reward', 'length', 'steps', 'epsilon', 'table_size', 'elapsed')
+
+
+class MetricsSink:
+    def __init__(self, path, buffer_size=500, append=False):
+        """
+        Args:
+            path (str): Output file; '.csv' writes CSV, anything else JSONL.
+            buffer_size (int): Records kept in memory between writes.
+            append (bool): Append to an existing file (e.g. when resuming)
+                instead of truncating it.
+        """
+        self.path = path
+        self.buffer_size = buffer_size
+        self.csv = path.endswith('.csv')
+        self.started = time.perf_counter()
+        self._buffer = []
+        write_header = self.csv and not (append and os.path.exists(path) and os.path.getsize(path))
+        self._file = open(path, 'a' if append else 'w', newline='')
+        if write_header:
+            self._file.write(','.join(METRIC_FIELDS) + '\n')
+
+    def record(self, episode, reward, length, steps, epsilon, table_size):
+        """Queues one episode; written out every `buffer_size` records."""
+        self._buffer.append((episode, reward, length, steps, epsilon, table_size,
+                             round(time.perf_counter() - self.started, 3)))
+        if len(self._buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+        if self.csv:
+            lines = [','.join(map(str, row)) for row in self._buffer]
+        else:
+            lines = [json.dumps(dict(zip(METRIC_FIELDS, row))) for row in self._buffer]
+        self._file.write('\n'.join(lines) + '\n')
+        self._file.flush()
+        self._buffer.clear()
+
+    def tell(self):
+        """Flushes and returns the file size, e.g. to store in a checkpoint."""
+        self.flush()
+        return self._file.tell()
+
+    def truncate(self, offset):
+        """
+        Drops everything after byte `offset` (records written after the
+        checkpoint being resumed from), including unwritten records.
+        """
+        self._buffer.clear()
+        self._file.flush()
+        self._file.truncate(offset)
+        self._file.seek(offset)
+
+    def close(self):
+        if not self._file.closed:
+            self.flush()
+            self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def metrics_path(q_table_path, extension='.jsonl'):
+    """Where the metrics of a run go: next to its Q-table."""
+    return os.path.splitext(q_table_path)[0] + '_metrics' + extension
+
+
+def read_metrics(path):
+    """
+    Yields one dict per episode from a JSONL or CSV metrics file, reading
+    the file line by line. A partially written last line (the file is
+    still being written) is skipped.
+    """
+    with open(path, newline='') as f:
+        if path.endswith('.csv'):
+            for row in csv.DictReader(f):
+                if None in row.values():
+                    continue
+                yield {k: (float(v) if k in ('reward', 'epsilon', 'elapsed') else int(v))
+                       for k, v in row.items()}
+        else:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
@@ -0,0 +1,352 @@
+# param_server.py
+#
+# Parameter-server training across processes or hosts. The server holds the
+# authoritative dense Q-table and applies the transitions actors send it
+# with Agent.learn_batch, i.e. the same Q-learning rule as single-process
+# training. Actors play their own Environment with an epsilon-greedy policy
+# on a local copy of the table and periodically pull the rows that changed
+# since their copy's version.
+#
+# Messages (multiprocessing.connection, authenticated with a shared key;
+# messages are pickles, so only share the key with trusted actors):
+#   ('push', blob)     -> ('ok', version)       blob: zlib(TRANSITION_DTYPE array)
+#   ('pull', version)  -> ('rows', version, rows_blob, values_blob, visited_blob)
+#                         zlib-compressed rows changed after `version`
+#   ('stop',)          -> ('ok', version)       server saves and shuts down
+#
+# Usage:
+#   python param_server.py serve --state S5 --reward R1 --port 6000
+#       (prints a random key unless --authkey is given; the table is saved to
+#       q_tables_ps/q_table_S5_R1.pkl, where evaluate_all_tables.py finds it)
+#   python param_server.py actor --host 10.0.0.1 --port 6000 --authkey <key> --state S5 --reward R1 --episodes 5000
+#   python param_server.py local --state S5 --reward R1 --actors 4 --episodes 2000    (all on localhost)
+
+import argparse
+import multiprocessing
+import os
+import random
+import secrets
+import threading
+import zlib
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Listener, Client
+import numpy as np
+from settings import ACTIONS, STATE_SPACES, REWARD_SETTINGS, NUM_EPISODES
+from environment import Environment
+from agent import Agent
+from async_training import collect_results
+
+DEFAULT_ADDRESS = ('localhost', 6000)
+TRANSITION_DTYPE = np.dtype([('state', '<i8'), ('action', 'i1'), ('reward', '<f4'),
+                             ('next_state', '<i8'), ('done', '?')])
+
+
+def pack_transitions(transitions):
+    return zlib.compress(transitions.tobytes())
+
+
+def unpack_transitions(blob):
+    return np.frombuffer(zlib.decompress(blob), dtype=TRANSITION_DTYPE)
+
+
+class ParameterServer:
+    def __init__(self, state_space, address=DEFAULT_ADDRESS, authkey=None, output=None):
+        """
+        Args:
+            state_space: A dense state space (S1, S2, S4 or S5).
+            address (tuple): (host, port) to listen on; port 0 picks a free one.
+            authkey (bytes): Shared secret actors must present; a random one
+                (see .authkey) by default.
+            output (str): Where the table is saved when the server stops.
+        """
+        self.agent = Agent(state_space=state_space, dense=True)
+        self.output = output
+        self.version = 0
+        # Version of the last update that touched each row, for delta pulls
+        self.row_versions = np.zeros(len(self.agent.q_table.visited), dtype=np.int64)
+        self.transitions = 0
+        self._lock = threading.Lock()
+        self.authkey = authkey or secrets.token_hex(16).encode()
+        self._listener = Listener(address, authkey=self.authkey)
+        self._stopped = threading.Event()
+        self._serving = False
+
+    @property
+    def address(self):
+        return self._listener.address
+
+    # -----------------------------
+    # Table updates
+    # -----------------------------
+    def apply(self, transitions):
+        """Applies a TRANSITION_DTYPE array with Agent.learn_batch."""
+        with self._lock:
+            self.agent.learn_batch(transitions['state'], transitions['action'], transitions['reward'],
+                                   transitions['next_state'], transitions['done'])
+            self.version += 1
+            self.row_versions[transitions['state']] = self.version
+            self.row_versions[transitions['next_state']] = self.version
+            self.transitions += len(transitions)
+            return self.version
+
+    def rows_since(self, version):
+        """Compressed rows changed after `version`, and the current version."""
+        with self._lock:
+            rows = np.flatnonzero(self.row_versions > version)
+            table = self.agent.q_table
+            return ('rows', self.version, zlib.compress(rows.tobytes()),
+                    zlib.compress(table.values[rows].tobytes()),
+                    zlib.compress(table.visited[rows].tobytes()))
+
+    # -----------------------------
+    # Serving
+    # -----------------------------
+    def serve_forever(self):
+        """Accepts actors (one thread each) until a 'stop' message arrives."""
+        self._serving = True
+        while not self._stopped.is_set():
+            try:
+                conn = self._listener.accept()
+            except AuthenticationError as e:
+                print(f"Rejected a connection: {e}")
+                continue
+            except (OSError, EOFError):
+                continue
+            if self._stopped.is_set():
+                conn.close()
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+        self._serving = False
+        self._listener.close()
+        if self.output:
+            os.makedirs(os.path.dirname(self.output) or '.', exist_ok=True)
+            with self._lock:
+                self.agent.save_q_table(self.output)
+
+    def start(self):
+        """Serves in a background thread (e.g. for localhost runs); returns it."""
+        thread = threading.Thread(target=self.serve_forever, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        if self._stopped.is_set():
+            return
+        self._stopped.set()
+        if self._serving:
+            # Closing the listener does not wake a blocked accept(); a
+            # connection does
+            Client(self.address, authkey=self.authkey).close()
+        else:
+            self._listener.close()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, OSError):
+                    return
+                kind = message[0]
+                if kind == 'push':
+                    conn.send(('ok', self.apply(unpack_transitions(message[1]))))
+                elif kind == 'pull':
+                    conn.send(self.rows_since(message[1]))
+                elif kind == 'stop':
+                    conn.send(('ok', self.version))
+                    self.stop()
+                    return
+                else:
+                    conn.send(('error', f"Unknown message {kind!r}"))
+
+
+# -----------------------------
+# Actors
+# -----------------------------
+class Actor:
+    def __init__(self, state_space, address, authkey, batch_size=256, pull_every=4):
+        """
+        Args:
+            address (tuple): The server's (host, port).
+            authkey (bytes): The server's key.
+            batch_size (int): Transitions per push.
+            pull_every (int): Pull fresh rows after this many pushes.
+        """
+        self.agent = Agent(state_space=state_space, dense=True)
+        self.conn = Client(address, authkey=authkey)
+        self.batch_size = batch_size
+        self.pull_every = pull_every
+        self.version = 0
+        self._batch = np.zeros(batch_size, dtype=TRANSITION_DTYPE)
+        self._count = 0
+        self._pushes = 0
+
+    def record(self, state, action, reward, next_state, done):
+        """Queues one transition; pushes (and maybe pulls) when the batch is full."""
+        self._batch[self._count] = (state, ACTIONS.index(action), reward, next_state, done)
+        self._count += 1
+        if self._count == self.batch_size:
+            self.push()
+
+    def push(self):
+        if not self._count:
+            return
+        self.conn.send(('push', pack_transitions(self._batch[:self._count])))
+        self.conn.recv()
+        self._count = 0
+        self._pushes += 1
+        if self._pushes % self.pull_every == 0:
+            self.pull()
+
+    def pull(self):
+        """Copies the rows changed since the last pull into the local table."""
+        self.conn.send(('pull', self.version))
+        _, self.version, rows, values, visited = self.conn.recv()
+        rows = np.frombuffer(zlib.decompress(rows), dtype=np.int64)
+        table = self.agent.q_table
+        table.values[rows] = np.frombuffer(zlib.decompress(values), dtype=np.float32).reshape(-1, len(ACTIONS))
+        table.visited[rows] = np.frombuffer(zlib.decompress(visited), dtype=bool)
+
+    def close(self, stop_server=False):
+        self.push()
+        if stop_server:
+            self.conn.send(('stop',))
+            self.conn.recv()
+        self.conn.close()
+
+
+def run_actor(state_space, rewards, address, authkey, num_episodes=NUM_EPISODES,
+              batch_size=256, pull_every=4, seed=None):
+    """
+    Plays `num_episodes` episodes, streaming transitions to the server.
+    If an episode raises, a failure of the final push (e.g. the server is
+    gone) is only reported, so the original exception propagates.
+
+    Returns:
+        tuple: (total_rewards, lengths)
+    """
+    if seed is not None:
+        random.seed(seed)
+        np.random.seed(seed)
+    actor = Actor(state_space, address, authkey, batch_size, pull_every)
+    actor.pull()
+    agent = actor.agent
+    env = Environment(rewards=rewards)
+    total_rewards, lengths = [], []
+    try:
+        for _ in range(num_episodes):
+            env.reset()
+            state = agent.get_state(env.snake, env.food)
+            done = False
+            episode_reward = 0
+            while not done:
+                action = agent.choose_action(state)
+                reward, done = env.step(action)
+                next_state = agent.get_state(env.snake, env.food)
+                actor.record(state, action, reward, next_state, done)
+                state = next_state
+                episode_reward += reward
+            agent.update_exploration_rate()
+            total_rewards.append(episode_reward)
+            lengths.append(env.snake.length)
+    except BaseException:
+        try:
+            actor.close()
+        except (OSError, EOFError) as e:
+            print(f"Dropped the last transitions, the server is unreachable: {e!r}")
+        raise
+    actor.close()
+    return total_rewards, lengths
+
+
+def _actor_process(state_name, reward_name, num_episodes, address, authkey, batch_size, seed, results):
+    curves = run_actor(STATE_SPACES[state_name], REWARD_SETTINGS[reward_name], address, authkey,
+                       num_episodes, batch_size, seed=seed)
+    results.put((seed, curves))
+
+
+def run_local(state_name, reward_name, num_episodes=NUM_EPISODES, actors=2, batch_size=256,
+              seed=0, output=None):
+    """
+    Server in this process plus `actors` actor processes, all on localhost.
+
+    Returns:
+        tuple: (server, [(total_rewards, lengths) per actor])
+    """
+    server = ParameterServer(STATE_SPACES[state_name], ('localhost', 0), output=output)
+    thread = server.start()
+    ctx = multiprocessing.get_context('spawn')
+    results = ctx.Queue()
+    processes = [ctx.Process(target=_actor_process, daemon=True, args=(
+        state_name, reward_name, num_episodes // actors + (i < num_episodes % actors),
+        server.address, server.authkey, batch_size, seed + i, results)) for i in range(actors)]
+    try:
+        for process in processes:
+            process.start()
+        curves = [c for _, c in sorted(collect_results(results, processes))]
+        for process in processes:
+            process.join()
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+                process.join()
+        server.stop()
+        thread.join()
+    return server, curves
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Parameter-server Q-learning.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name, help_text in [('serve', "Hold the Q-table and apply actors' transitions"),
+                            ('actor', "Play episodes and stream transitions to a server"),
+                            ('local', "Server plus actor processes on localhost")]:
+        p = sub.add_parser(name, help=help_text)
+        p.add_argument('--state', default='S5', choices=['S1', 'S2', 'S4', 'S5'])
+        if name == 'serve':
+            p.add_argument('--authkey', default=None, help="Key actors must present (default: random, printed)")
+        elif name == 'actor':
+            p.add_argument('--authkey', required=True, help="The key printed by the server")
+        if name != 'local':
+            p.add_argument('--host', default=DEFAULT_ADDRESS[0])
+            p.add_argument('--port', type=int, default=DEFAULT_ADDRESS[1])
+        p.add_argument('--reward', default='R1', choices=list(REWARD_SETTINGS),
+                       help="Reward setting (for serve: only names the default output)")
+        if name != 'serve':
+            p.add_argument('--episodes', type=int, default=NUM_EPISODES)
+            p.add_argument('--batch-size', type=int, default=256, help="Transitions per push")
+            p.add_argument('--seed', type=int, default=None)
+        if name != 'actor':
+            p.add_argument('--output', default=None,
+                           help="Where the server saves the Q-table (default: q_tables_ps/q_table_<state>_<reward>.pkl)")
+        if name == 'local':
+            p.add_argument('--actors', type=int, default=2)
+        if name == 'actor':
+            p.add_argument('--stop-server', action='store_true', help="Stop the server when done")
+    args = parser.parse_args()
+    authkey = args.authkey.encode() if getattr(args, 'authkey', None) else None
+    if args.command != 'actor':
+        args.output = args.output or os.path.join("q_tables_ps", f"q_table_{args.state}_{args.reward}.pkl")
+
+    if args.command == 'serve':
+        server = ParameterServer(STATE_SPACES[args.state], (args.host, args.port), authkey, args.output)
+        print(f"Serving {args.state} on {server.address} with key {server.authkey.decode()}")
+        server.serve_forever()
+        print(f"Stopped after {server.transitions} transitions")
+    elif args.command == 'actor':
+        address = (args.host, args.port)
+        total_rewards, lengths = run_actor(STATE_SPACES[args.state], REWARD_SETTINGS[args.reward],
+                                           address, authkey, args.episodes, args.batch_size, seed=args.seed)
+        if args.stop_server:
+            conn = Client(address, authkey=authkey)
+            conn.send(('stop',))
+            conn.recv()
+            conn.close()
+        print(f"{len(total_rewards)} episodes; mean reward of the last 100: {np.mean(total_rewards[-100:]):.2f}")
+    else:
+        server, curves = run_local(args.state, args.reward, args.episodes, args.actors, args.batch_size,
+                                   args.seed or 0, args.output)
+        rewards = [r for total_rewards, _ in curves for r in total_rewards[-100:]]
+        print(f"{server.transitions} transitions from {args.actors} actors; "
+              f"mean reward of their last 100 episodes: {np.mean(rewards):.2f}")
@@ -1,10 +1,11 @@
 import argparse
 import pygame
 import sys
-import os
 from agent import Agent           # Q-learning agent
 from sarsa_agent import SarsaAgent  # SARSA agent
 from environment import Environment
+from rendering import IncrementalRenderer
+from qtable_io import parse_state_reward as parse_table_name
 from settings import (
     STATE_SPACES,
     REWARD_SETTINGS,
@@ -19,19 +20,10 @@ def parse_state_reward(filename):
     """
     Extracts state (e.g., S1, S5) and reward (e.g., R1, R3) from the Q-table filename.
     Assumes filenames like:
-      'q_table_S5_R2.pkl' or 'sarsa_qtable_S1_R3.pkl'
+      'q_table_S5_R2.pkl', 'q_table_S5_R2.qtb' or 'sarsa_qtable_S1_R3.pkl'
     Returns (state, reward).
     """
-    base = os.path.basename(filename)
-    base = base.replace('.pkl', '')
-    parts = base.split('_')
-
-    state, reward = None, None
-    for p in parts:
-        if p in STATE_SPACES:
-            state = p
-        if p in REWARD_SETTINGS:
-            reward = p
+    state, reward = parse_table_name(filename)
     if not state or not reward:
         raise ValueError(f"Unable to parse state or reward from filename: {filename}")
     return state, reward
@@ -67,6 +59,7 @@ def play_agent(qtable_path, agent_type):
     pygame.display.set_caption(f"Snake Game - {agent_type} Agent")
     clock = pygame.time.Clock()
     font = pygame.font.SysFont(FONT_NAME, FONT_SIZE)
+    renderer = IncrementalRenderer(screen, font)
 
     state = agent.get_state(env.snake, env.food)
     done = False
@@ -89,18 +82,59 @@ def play_agent(qtable_path, agent_type):
         total_reward += reward
         steps += 1
 
-        # Render the environment
-        env.draw(screen, font, episode=1)
-        pygame.display.update()
+        # Render the environment (only the cells that changed)
+        renderer.draw(env, episode=1)
         clock.tick(FPS)
 
-    print(f"Game Over! Total Steps: {steps}, Total Reward: {total_reward}, Snake Length: {len(env.snake.body)}")
+    print(f"Game Over! Total Steps: {steps}, Total Reward: {total_reward}, Snake Length: {env.snake.length}")
+    pygame.quit()
+
+def play_recording(recording_path, index=0, reward=None):
+    """
+    Replays a recorded episode (see recording.py) in the game window.
+
+    Args:
+        recording_path: Path to a .rec file.
+        index: Which episode of the file to show.
+        reward: Reward id to score it with; defaults to the one it was recorded with.
+    """
+    from recording import load_recordings, replay
+
+    recording = load_recordings(recording_path)[index]
+    reward = reward or recording.meta.get('reward', 'R1')
+    print(f"Replaying episode {index} of {recording_path} ({recording.steps} steps, reward {reward})")
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    pygame.display.set_caption(f"Snake Game - Replay {index}")
+    clock = pygame.time.Clock()
+    font = pygame.font.SysFont(FONT_NAME, FONT_SIZE)
+    renderer = IncrementalRenderer(screen, font)
+
+    def show(env):
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                pygame.quit()
+                sys.exit()
+        renderer.draw(env, episode=index)
+        clock.tick(FPS)
+
+    total_reward, length, steps, _ = replay(recording, REWARD_SETTINGS[reward], on_step=show)
+    print(f"Replay finished! Total Steps: {steps}, Total Reward: {total_reward}, Snake Length: {length}")
     pygame.quit()
 
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Play Snake game using a trained agent.")
-    parser.add_argument('--agent_type', type=str, required=True, help="Agent type: 'Q' for Q-learning, 'SARSA' for SARSA")
-    parser.add_argument('--qtable', type=str, required=True, help="Path to the Q-table file")
+    parser.add_argument('--agent_type', type=str, help="Agent type: 'Q' for Q-learning, 'SARSA' for SARSA")
+    parser.add_argument('--qtable', type=str, help="Path to the Q-table file (.pkl or memory-mapped .qtb)")
+    parser.add_argument('--replay', type=str, help="Show a recorded episode from this .rec file instead")
+    parser.add_argument('--index', type=int, default=0, help="Episode of the --replay file to show")
+    parser.add_argument('--reward', type=str, default=None, help="Reward id to score the replay with")
 
     args = parser.parse_args()
-    play_agent(qtable_path=args.qtable, agent_type=args.agent_type)
+    if args.replay:
+        play_recording(args.replay, index=args.index, reward=args.reward)
+    elif args.agent_type and args.qtable:
+        play_agent(qtable_path=args.qtable, agent_type=args.agent_type)
+    else:
+        parser.error("--agent_type and --qtable are required unless --replay is given")
@@ -2,8 +2,10 @@
 
 import pygame
 import sys
-from settings import (SCREEN_WIDTH, SCREEN_HEIGHT, FONT_NAME, FONT_SIZE, FPS)
+from settings import (SCREEN_WIDTH, SCREEN_HEIGHT, GRID_WIDTH, GRID_HEIGHT,
+                      FONT_NAME, FONT_SIZE, FPS)
 from environment import Environment
+from rendering import IncrementalRenderer
 
 def turn_left(direction):
     directions = ['UP', 'LEFT', 'DOWN', 'RIGHT']
@@ -32,6 +34,7 @@ def main():
     pygame.display.set_caption('Snake Game - Manual Play')
     clock = pygame.time.Clock()
     font = pygame.font.SysFont(FONT_NAME, FONT_SIZE)
+    renderer = IncrementalRenderer(screen, font)
 
     env = Environment()
     done = False
@@ -68,27 +71,23 @@ def main():
         action = 'STRAIGHT'
 
         # Check collision with food
-        if env.snake.body[0] == env.food.position:
+        if env.snake.head == env.food.position:
             env.snake.grow()
             env.score += 1
             # Place new food
-            while True:
-                env.food = env.food.__class__()
-                if env.food.position not in env.snake.body:
-                    break
+            env.spawn_food()
 
         # Check collision with walls or self
-        head_x, head_y = env.snake.body[0]
-        if (head_x < 0 or head_x >= SCREEN_WIDTH or
-            head_y < 0 or head_y >= SCREEN_HEIGHT or
-            env.snake.body[0] in env.snake.body[1:]):
+        head_x, head_y = env.snake.head
+        if (head_x < 0 or head_x >= GRID_WIDTH or
+            head_y < 0 or head_y >= GRID_HEIGHT or
+            env.snake.hits_itself()):
             print(f"Game Over! Score: {env.score}")
             done = True
             break
 
         # Draw everything
-        env.draw(screen, font, episode)
-        pygame.display.update()
+        renderer.draw(env, episode)
         clock.tick(FPS / 5)
 
     # Close the game
@@ -0,0 +1,123 @@
+# plot_metrics.py
+#
+# Offline plots of metrics files written by MetricsSink (see metrics.py).
+# Files are streamed; each curve keeps at most --max-points points, halving
+# its resolution whenever it fills up, so memory stays bounded for
+# multi-million-episode runs and files that are still being written can be
+# plotted at any time.
+#
+# Usage:
+#   python plot_metrics.py q_tables/*_metrics.jsonl
+#   python plot_metrics.py run_metrics.csv --fields reward,length,epsilon --window 200 --output run.png
+
+import argparse
+import os
+from collections import deque
+from metrics import read_metrics
+
+
+class Downsampler:
+    def __init__(self, max_points):
+        """Keeps every `stride`-th point; doubles the stride when full."""
+        self.max_points = max_points
+        self.stride = 1
+        self.count = 0
+        self.x = []
+        self.y = []
+
+    def add(self, x, y):
+        if self.count % self.stride == 0:
+            self.x.append(x)
+            self.y.append(y)
+            if len(self.x) >= self.max_points:
+                self.x = self.x[::2]
+                self.y = self.y[::2]
+                self.stride *= 2
+        self.count += 1
+
+
+def load_curves(path, fields, window, max_points):
+    """
+    Moving averages (over `window` episodes) of `fields` from one metrics
+    file, downsampled to at most `max_points` points each.
+
+    Returns:
+        dict: {field: (episodes, values)}
+    """
+    windows = {field: deque(maxlen=window) for field in fields}
+    sums = {field: 0.0 for field in fields}
+    curves = {field: Downsampler(max_points) for field in fields}
+    for record in read_metrics(path):
+        for field in fields:
+            values = windows[field]
+            if len(values) == window:
+                sums[field] -= values[0]
+            values.append(record[field])
+            sums[field] += record[field]
+            curves[field].add(record['episode'], sums[field] / len(values))
+    return {field: (c.x, c.y) for field, c in curves.items()}
+
+
+def plot_metrics(paths, fields=('reward', 'length'), window=50, max_points=4000,
+                 output=None, show=False):
+    """
+    One subplot per field, one line per metrics file. Saved to `output`
+    (default: next to the first file) unless `show` is set. The matplotlib
+    backend is left to the caller (the CLI below picks Agg when saving).
+    """
+    import matplotlib.pyplot as plt
+
+    fig, axes = plt.subplots(1, len(fields), figsize=(6 * len(fields), 5), squeeze=False)
+    for path in paths:
+        label = os.path.basename(path).replace('_metrics', '').rsplit('.', 1)[0]
+        curves = load_curves(path, fields, window, max_points)
+        for ax, field in zip(axes[0], fields):
+            ax.plot(*curves[field], label=label)
+
+    for ax, field in zip(axes[0], fields):
+        ax.set_title(f"{field} (moving average, window {window})")
+        ax.set_xlabel("Episode")
+        ax.set_ylabel(field)
+        ax.legend()
+    fig.tight_layout()
+
+    if show:
+        plt.show()
+        return None
+    if output is None:
+        output = os.path.splitext(paths[0])[0] + '.png'
+    fig.savefig(output)
+    plt.close(fig)
+    print(f"Plot saved to {output}")
+    return output
+
+
+def plot_metrics_by_reward(metrics_files):
+    """
+    Saves one plot per reward setting, comparing its state spaces, as
+    metrics_<reward>.png next to the files.
+
+    Args:
+        metrics_files (dict): {reward_name: [metrics file paths]}
+    """
+    for reward_name, paths in metrics_files.items():
+        if paths:
+            plot_metrics(sorted(paths), output=os.path.join(
+                os.path.dirname(paths[0]), f"metrics_{reward_name}.png"))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Plot per-episode training metrics (JSONL or CSV).")
+    parser.add_argument('files', nargs='+', help="Metrics files written by MetricsSink")
+    parser.add_argument('--fields', default='reward,length', help="Comma-separated fields to plot")
+    parser.add_argument('--window', type=int, default=50, help="Moving-average window in episodes")
+    parser.add_argument('--max-points', type=int, default=4000, help="Points kept per curve")
+    parser.add_argument('--output', default=None, help="Image file (default: next to the first input)")
+    parser.add_argument('--show', action='store_true', help="Open a window instead of saving")
+    args = parser.parse_args()
+
+    if not args.show:
+        import matplotlib
+        matplotlib.use('Agg')
+    plot_metrics(args.files, fields=args.fields.split(','), window=args.window,
+                 max_points=args.max_points, output=args.output, show=args.show)
@@ -0,0 +1,332 @@
+# qtable.py
+#
+# Dense Q-table backend for state spaces whose features have small, known
+# ranges (S1, S2, S4 and S5). A state tuple is mapped to a row index with a
+# mixed-radix encoding and all Q-values live in one float32 array of shape
+# (num_states, len(ACTIONS)).
+
+import numpy as np
+from settings import ACTIONS, GRID_WIDTH, GRID_HEIGHT, STATE_SPACES
+from features import compile_state_encoder
+
+# Features whose value is an (x, y) tuple; they are flattened to
+# '<name>.x' and '<name>.y' columns.
+TUPLE_FEATURES = {'relative_food', 'relative_tail'}
+
+# Digits of the mixed-radix index, most significant first:
+#   ('value', column, low, high)  -> value - low, radix high - low + 1
+#   ('onehot', [columns])         -> position of the 1, radix len(columns)
+# Columns that are fully determined by others (e.g. wall_dist_down is
+# GRID_HEIGHT - wall_dist_up) are left out. Ranges include the terminal
+# state after a wall hit, where the head is one cell outside the grid.
+DENSE_LAYOUT_SPECS = {
+    "S1": [
+        ('value', 'wall_straight', 0, 1),
+        ('value', 'wall_left', 0, 1),
+        ('value', 'wall_right', 0, 1),
+        ('value', 'relative_food.x', -1, 1),
+        ('value', 'relative_food.y', -1, 1),
+        ('value', 'relative_tail.x', -1, 1),
+        ('value', 'relative_tail.y', -1, 1),
+    ],
+    "S2": [
+        ('value', 'danger_straight', 0, 1),
+        ('value', 'danger_left', 0, 1),
+        ('value', 'danger_right', 0, 1),
+        ('onehot', ['moving_left', 'moving_right', 'moving_up', 'moving_down']),
+        ('value', 'food_left', 0, 1),
+        ('value', 'food_up', 0, 1),
+        ('value', 'food_down', 0, 1),
+    ],
+    "S4": [
+        ('value', 'danger_straight', 0, 1),
+        ('value', 'danger_left', 0, 1),
+        ('value', 'danger_right', 0, 1),
+        ('onehot', ['snake_direction_up', 'snake_direction_down',
+                    'snake_direction_left', 'snake_direction_right']),
+        ('value', 'food_dist_x', 0, GRID_WIDTH),
+        ('value', 'food_dist_y', 0, GRID_HEIGHT),
+        ('value', 'wall_dist_up', -1, GRID_HEIGHT),
+        ('value', 'wall_dist_left', -1, GRID_WIDTH),
+    ],
+    "S5": [
+        ('value', 'danger_straight', 0, 1),
+        ('value', 'danger_left', 0, 1),
+        ('value', 'danger_right', 0, 1),
+        ('onehot', ['snake_direction_left', 'snake_direction_right',
+                    'snake_direction_up', 'snake_direction_down']),
+        ('value', 'food_direction_x', -1, 1),
+        ('value', 'food_direction_y', -1, 1),
+    ],
+}
+
+
+def flat_columns(state_space):
+    """Column names of a state tuple once tuple-valued features are flattened."""
+    columns = []
+    for name in state_space:
+        if name in TUPLE_FEATURES:
+            columns.extend([f'{name}.x', f'{name}.y'])
+        else:
+            columns.append(name)
+    return columns
+
+
+class DenseLayout:
+    def __init__(self, name, state_space):
+        """
+        Mixed-radix mapping from state tuples of `state_space` to row indices.
+
+        Because every digit is linear in the (flattened) feature values, the
+        index is `offset + sum(weights * features)`, which works the same for
+        one state tuple and for an (N, columns) feature array.
+
+        Args:
+            name: Key of DENSE_LAYOUT_SPECS (e.g. "S5").
+            state_space: Feature list in the order the encoder produces it.
+        """
+        self.name = name
+        self.state_space = list(state_space)
+        self.columns = flat_columns(state_space)
+        self.nested = any(n in TUPLE_FEATURES for n in state_space)
+
+        position = {column: i for i, column in enumerate(self.columns)}
+        weights = np.zeros(len(self.columns), dtype=np.int64)
+        offset = 0
+        stride = 1
+        for digit in reversed(DENSE_LAYOUT_SPECS[name]):
+            if digit[0] == 'value':
+                _, column, low, high = digit
+                weights[position[column]] += stride
+                offset -= low * stride
+                stride *= high - low + 1
+            else:
+                _, group = digit
+                for k, column in enumerate(group):
+                    weights[position[column]] += k * stride
+                stride *= len(group)
+
+        self.size = stride
+        self.weights = weights
+        self.offset = offset
+        self._terms = [(i, int(w)) for i, w in enumerate(weights) if w]
+
+    def flatten(self, state):
+        flat = []
+        for value in state:
+            if isinstance(value, tuple):
+                flat.extend(value)
+            else:
+                flat.append(value)
+        return flat
+
+    def index(self, state):
+        """Row index of one state tuple."""
+        if self.nested:
+            state = self.flatten(state)
+        index = self.offset
+        for i, weight in self._terms:
+            index += state[i] * weight
+        return index
+
+    def index_batch(self, features):
+        """Row indices of an (N, columns) integer feature array."""
+        return np.asarray(features, dtype=np.int64) @ self.weights + self.offset
+
+
+def dense_layout(state_space):
+    """
+    Returns the DenseLayout for `state_space`, or raises ValueError if the
+    state space has no bounded layout (e.g. S3).
+    """
+    features = set(state_space)
+    for name in DENSE_LAYOUT_SPECS:
+        if features == set(STATE_SPACES[name]):
+            return DenseLayout(name, state_space)
+    raise ValueError("No dense Q-table layout for this state space "
+                     "(supported: " + ", ".join(DENSE_LAYOUT_SPECS) + ")")
+
+
+class DenseQTable:
+    def __init__(self, layout, values=None, visited=None):
+        """
+        Q-table stored as one preallocated float32 array indexed by
+        layout.index(state). It supports the dict operations the agents use
+        (`in`, `[]`, `[] =`, `len`), so states are row indices instead of
+        tuples. `visited` marks rows that were ever written, which keeps the
+        "unseen state -> random action" behaviour of the dict table.
+        """
+        self.layout = layout
+        if values is None:
+            values = np.zeros((layout.size, len(ACTIONS)), dtype=np.float32)
+        if visited is None:
+            visited = np.zeros(layout.size, dtype=bool)
+        self.values = values
+        self.visited = visited
+        if values.ndim != 2 or not values.flags.c_contiguous:
+            raise ValueError("DenseQTable values must be a C-contiguous 2-D array")
+
+    def __contains__(self, state):
+        return self.visited[state]
+
+    def __getitem__(self, state):
+        return self.values[state]
+
+    def __setitem__(self, state, row):
+        self.values[state] = row
+        self.visited[state] = True
+
+    def __len__(self):
+        return int(np.count_nonzero(self.visited))
+
+    def keys(self):
+        return np.flatnonzero(self.visited)
+
+    @classmethod
+    def from_dict(cls, layout, q_table):
+        """Builds a dense table from a {state tuple: q-values} dict."""
+        table = cls(layout)
+        for state, q_values in q_table.items():
+            table[layout.index(state)] = q_values
+        return table
+
+
+def coerce_q_table(q_table, layout):
+    """
+    Converts a loaded Q-table to the backend an agent uses: dense when
+    `layout` is given, otherwise the dict (or dict-like MappedQTable) as is.
+    Agents adopt the layout of a dense table before calling this, so the
+    error below only fires when a dense table is forced onto a dict agent.
+    """
+    if layout is not None:
+        if isinstance(q_table, DenseQTable):
+            return q_table
+        return DenseQTable.from_dict(layout, q_table)
+    if isinstance(q_table, DenseQTable):
+        raise ValueError("This Q-table is dense; create the agent with dense=True to load it")
+    return q_table
+
+
+def compile_state_indexer(state_space, layout):
+    """
+    Fuses the state encoder for `state_space` with `layout.index`, giving
+    encode(snake, food) -> row index.
+    """
+    encode = compile_state_encoder(state_space)
+    index = layout.index
+
+    def encode_index(snake, food):
+        return index(encode(snake, food))
+    return encode_index
+
+
+# -----------------------------
+# Batched operations on DenseQTable
+# -----------------------------
+class RandomBlocks:
+    def __init__(self, rng=None, block_size=65536):
+        """
+        Hands out uniform floats and random action indices from pre-drawn
+        blocks, so batched action selection does one RNG call per block
+        instead of one per board.
+        """
+        self.rng = rng if rng is not None else np.random.default_rng()
+        self.block_size = block_size
+        self._uniforms = np.empty(0)
+        self._actions = np.empty(0, dtype=np.int64)
+
+    def uniforms(self, n):
+        if len(self._uniforms) < n:
+            self._uniforms = self.rng.random(max(n, self.block_size))
+        out, self._uniforms = self._uniforms[:n], self._uniforms[n:]
+        return out
+
+    def actions(self, n):
+        if len(self._actions) < n:
+            self._actions = self.rng.integers(0, len(ACTIONS), size=max(n, self.block_size))
+        out, self._actions = self._actions[:n], self._actions[n:]
+        return out
+
+
+def epsilon_greedy_batch(q_table, states, exploration_rate, random_blocks):
+    """
+    Epsilon-greedy action indices for a vector of state indices. Like
+    choose_action, an unseen state gets a random action and is marked as
+    visited (its row is still all zeros).
+    """
+    states = np.asarray(states, dtype=np.int64)
+    n = len(states)
+    greedy = np.argmax(q_table.values[states], axis=1)
+    explore = random_blocks.uniforms(n) < exploration_rate
+    explore |= ~q_table.visited[states]
+    q_table.visited[states] = True
+    return np.where(explore, random_blocks.actions(n), greedy)
+
+
+def apply_td_targets(q_table, states, actions, targets, learning_rate):
+    """
+    Moves Q(s, a) towards `targets` as if the updates
+        Q(s, a) <- Q(s, a) + alpha_i * (target_i - Q(s, a))
+    were applied one after another in batch order. Targets are fixed
+    before the batch; the k updates of one (s, a) collapse to
+        Q * prod_i (1 - alpha_i) + sum_i alpha_i * target_i * prod_{j > i} (1 - alpha_j)
+    so duplicates are neither lost (as with fancy-index assignment) nor
+    over-applied (as with np.add.at on independent deltas). Results match
+    the sequential loop up to float rounding.
+
+    Args:
+        learning_rate: Scalar, or one rate per transition (e.g. scaled by
+            importance-sampling weights); each must be below 1.
+
+    Returns:
+        np.ndarray: TD errors (target - Q before the batch), in batch order.
+    """
+    num_actions = q_table.values.shape[1]
+    flat_values = q_table.values.reshape(-1)
+    flat = np.asarray(states, dtype=np.int64) * num_actions + np.asarray(actions, dtype=np.int64)
+    targets = np.asarray(targets, dtype=np.float64)
+    td_errors = targets - flat_values[flat]
+    if len(flat) == 0:
+        return td_errors
+
+    order = np.argsort(flat, kind='stable')
+    sorted_flat = flat[order]
+    starts = np.flatnonzero(np.r_[True, sorted_flat[1:] != sorted_flat[:-1]])
+    ends = np.r_[starts[1:], len(sorted_flat)]
+    group = np.repeat(np.arange(len(starts)), ends - starts)
+
+    rates = np.broadcast_to(np.asarray(learning_rate, dtype=np.float64), flat.shape)[order]
+    # log prod (1 - alpha) over the updates after each one in its group
+    log_keep = np.cumsum(np.log1p(-rates))
+    group_log_keep = log_keep[ends - 1]
+    before_group = np.where(starts > 0, log_keep[starts - 1], 0.0)
+    later = np.exp(group_log_keep[group] - log_keep)
+    contribution = np.bincount(group, weights=rates * targets[order] * later, minlength=len(starts))
+
+    cells = sorted_flat[starts]
+    flat_values[cells] = np.exp(group_log_keep - before_group) * flat_values[cells] + contribution
+    q_table.visited[cells // num_actions] = True
+    return td_errors
+
+
+def apply_traces(q_table, traces, state, action_idx, delta, learning_rate, decay, cutoff):
+    """
+    Replacing eligibility-trace update shared by QLambdaAgent and
+    SarsaLambdaAgent: sets the trace of (state, action_idx) to 1, moves
+    every traced Q(s, a) by learning_rate * delta * trace, then decays the
+    traces by `decay` (gamma * lambda) and drops those below `cutoff`.
+
+    Args:
+        q_table: Dict or DenseQTable; all traced states must have rows.
+        traces (dict): {(state, action index): trace}, updated in place.
+    """
+    traces[(state, action_idx)] = 1.0
+    step = learning_rate * delta
+    for key, trace in list(traces.items()):
+        s, a = key
+        q_table[s][a] += step * trace
+        trace *= decay
+        if trace < cutoff:
+            del traces[key]
+        else:
+            traces[key] = trace
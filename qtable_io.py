@@ -0,0 +1,293 @@
+# qtable_io.py
+#
+# Binary Q-table format (.qtb) that can be opened with numpy.memmap, so
+# evaluation workers start without unpickling and share the OS page cache
+# instead of each holding a private copy of the table.
+#
+# Layout (all blocks 64-byte aligned, little-endian):
+#   magic      8 bytes   b'SNAKEQTB'
+#   version    uint32
+#   header_len uint32
+#   header     JSON: state space id, reward id, hyperparameters, kind,
+#              shapes and byte offsets of the blocks below
+#   kind == "sparse" (dict tables, e.g. S3):
+#     hashes   uint64 (num_rows,)             sorted key hashes
+#     keys     int16  (num_rows, num_columns) flattened state tuples
+#     values   float32 (num_rows, num_actions)
+#   kind == "dense" (DenseQTable):
+#     values   float32 (layout.size, num_actions)
+#     visited  bool    (layout.size,)
+#
+# Usage:
+#   python qtable_io.py q_tables/*.pkl q_tables_sarsa/*.pkl
+
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import struct
+import numpy as np
+from settings import (
+    ACTIONS, STATE_SPACES, REWARD_SETTINGS, LEARNING_RATE, DISCOUNT_FACTOR,
+    EXPLORATION_RATE, EXPLORATION_DECAY, MIN_EXPLORATION_RATE, NUM_EPISODES
+)
+from qtable import DenseQTable, DenseLayout, TUPLE_FEATURES, flat_columns
+
+QTB_EXTENSION = '.qtb'
+MAGIC = b'SNAKEQTB'
+VERSION = 1
+ALIGNMENT = 64
+
+
+def parse_state_reward(filename):
+    """
+    Parses the state and reward ids from a Q-table filename such as
+    'q_table_S5_R2.pkl' or 'sarsa_qtable_S1_R3.qtb'.
+
+    Returns:
+        tuple: (state, reward) or (None, None) if parsing fails.
+    """
+    base = os.path.splitext(os.path.basename(filename))[0]
+    state, reward = None, None
+    for p in base.split('_'):
+        if p in STATE_SPACES:
+            state = p
+        if p in REWARD_SETTINGS:
+            reward = p
+    if not state or not reward:
+        return None, None
+    return state, reward
+
+
+def default_hyperparameters():
+    return {
+        'learning_rate': LEARNING_RATE,
+        'discount_factor': DISCOUNT_FACTOR,
+        'exploration_rate': EXPLORATION_RATE,
+        'exploration_decay': EXPLORATION_DECAY,
+        'min_exploration_rate': MIN_EXPLORATION_RATE,
+        'num_episodes': NUM_EPISODES,
+    }
+
+
+def key_hash(flat_key):
+    """Stable 64-bit hash of a flattened state (sequence of ints)."""
+    data = np.asarray(flat_key, dtype='<i2').tobytes()
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), 'little')
+
+
+def _flatten(state):
+    flat = []
+    for value in state:
+        if isinstance(value, tuple):
+            flat.extend(value)
+        else:
+            flat.append(value)
+    return flat
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+class MappedQTable:
+    def __init__(self, path, header):
+        """
+        Read-only view of a sparse .qtb file. Lookups binary-search the
+        memory-mapped hash block; results are memoised per process.
+        Writes (e.g. the zero row an agent inserts for an unseen state) go
+        to a small private overlay and never touch the file.
+        """
+        self.path = path
+        self.header = header
+        num_rows = header['num_rows']
+        num_columns = len(header['key_columns'])
+        self.hashes = np.memmap(path, dtype='<u8', mode='r',
+                                offset=header['hashes_offset'], shape=(num_rows,))
+        self.keys = np.memmap(path, dtype='<i2', mode='r',
+                              offset=header['keys_offset'], shape=(num_rows, num_columns))
+        self.values = np.memmap(path, dtype='<f4', mode='r',
+                                offset=header['values_offset'],
+                                shape=(num_rows, header['num_actions']))
+        self._rows = {}
+        self._overlay = {}
+        # Positions of the tuple-valued features, to rebuild state tuples
+        self._state_space = STATE_SPACES[header['state_space']]
+
+    def _row(self, state):
+        row = self._rows.get(state)
+        if row is None:
+            flat = _flatten(state)
+            h = np.uint64(key_hash(flat))
+            row = -1
+            i = int(np.searchsorted(self.hashes, h))
+            while i < len(self.hashes) and self.hashes[i] == h:
+                if list(self.keys[i]) == flat:
+                    row = i
+                    break
+                i += 1
+            self._rows[state] = row
+        return row
+
+    def __contains__(self, state):
+        return state in self._overlay or self._row(state) >= 0
+
+    def __getitem__(self, state):
+        if state in self._overlay:
+            return self._overlay[state]
+        row = self._row(state)
+        if row < 0:
+            raise KeyError(state)
+        return self.values[row]
+
+    def __setitem__(self, state, q_values):
+        self._overlay[state] = np.array(q_values, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.hashes) + len(self._overlay)
+
+    def _unflatten(self, flat):
+        state = []
+        i = 0
+        for name in self._state_space:
+            if name in TUPLE_FEATURES:
+                state.append((int(flat[i]), int(flat[i + 1])))
+                i += 2
+            else:
+                state.append(int(flat[i]))
+                i += 1
+        return tuple(state)
+
+    def items(self):
+        for row in range(len(self.hashes)):
+            yield self._unflatten(self.keys[row]), self.values[row]
+        yield from self._overlay.items()
+
+    def to_dict(self):
+        """Copies the table into a regular {state tuple: q-values} dict."""
+        return {state: np.array(q, dtype=np.float64) for state, q in self.items()}
+
+
+def save_q_table_binary(filename, q_table, state_name, reward_name,
+                        hyperparameters=None, algorithm=None):
+    """
+    Writes a dict or DenseQTable to the .qtb format.
+
+    Args:
+        filename (str): Output path.
+        q_table: {state tuple: q-values} dict or DenseQTable.
+        state_name (str): State space id (e.g. "S3").
+        reward_name (str): Reward id (e.g. "R1").
+        hyperparameters (dict): Stored in the header; defaults to settings.py.
+        algorithm (str): Optional label, e.g. "Q-Learning" or "SARSA".
+    """
+    header = {
+        'state_space': state_name,
+        'reward': reward_name,
+        'algorithm': algorithm,
+        'hyperparameters': hyperparameters or default_hyperparameters(),
+        'num_actions': len(ACTIONS),
+        'actions': ACTIONS,
+    }
+
+    if isinstance(q_table, DenseQTable):
+        header['kind'] = 'dense'
+        header['layout'] = q_table.layout.name
+        header['layout_state_space'] = q_table.layout.state_space
+        header['num_rows'] = q_table.layout.size
+        blocks = [('values', np.ascontiguousarray(q_table.values, dtype='<f4')),
+                  ('visited', np.ascontiguousarray(q_table.visited, dtype=bool))]
+    else:
+        columns = flat_columns(STATE_SPACES[state_name])
+        keys = np.array([_flatten(state) for state in q_table], dtype='<i2')
+        keys = keys.reshape(len(q_table), len(columns))
+        values = np.array([q_table[state] for state in q_table], dtype='<f4')
+        values = values.reshape(len(q_table), len(ACTIONS))
+        hashes = np.array([key_hash(k) for k in keys.tolist()], dtype='<u8')
+        order = np.argsort(hashes, kind='stable')
+        header['kind'] = 'sparse'
+        header['key_columns'] = columns
+        header['num_rows'] = len(q_table)
+        blocks = [('hashes', hashes[order]), ('keys', keys[order]), ('values', values[order])]
+
+    # Offsets depend on the header length, which depends on the offsets;
+    # reserve a fixed-width field for each offset.
+    for name, _ in blocks:
+        header[f'{name}_offset'] = 0
+    prefix = len(MAGIC) + 8
+    header_len = len(json.dumps(header)) + 16 * len(blocks)
+    offset = _align(prefix + header_len)
+    for name, block in blocks:
+        header[f'{name}_offset'] = offset
+        offset = _align(offset + block.nbytes)
+    header_bytes = json.dumps(header).encode('utf-8').ljust(header_len)
+
+    tmp_name = filename + '.tmp'
+    with open(tmp_name, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', VERSION, len(header_bytes)))
+        f.write(header_bytes)
+        for name, block in blocks:
+            f.seek(header[f'{name}_offset'])
+            f.write(block.tobytes())
+    os.replace(tmp_name, filename)
+
+
+def read_header(filename):
+    with open(filename, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{filename} is not a .qtb Q-table")
+        version, header_len = struct.unpack('<II', f.read(8))
+        if version != VERSION:
+            raise ValueError(f"Unsupported .qtb version {version} in {filename}")
+        return json.loads(f.read(header_len).decode('utf-8'))
+
+
+def load_q_table_binary(filename):
+    """
+    Opens a .qtb file without copying the Q-values.
+
+    Returns:
+        MappedQTable for sparse files, or a DenseQTable whose arrays are
+        copy-on-write memory maps for dense files.
+    """
+    header = read_header(filename)
+    if header['kind'] == 'sparse':
+        return MappedQTable(filename, header)
+
+    layout = DenseLayout(header['layout'], header['layout_state_space'])
+    values = np.memmap(filename, dtype='<f4', mode='c', offset=header['values_offset'],
+                       shape=(header['num_rows'], header['num_actions']))
+    visited = np.memmap(filename, dtype=bool, mode='c', offset=header['visited_offset'],
+                        shape=(header['num_rows'],))
+    return DenseQTable(layout, values=values, visited=visited)
+
+
+def convert_pickle(pkl_path, out_path=None, algorithm=None):
+    """
+    Converts a pickled Q-table (e.g. q_tables/q_table_S3_R1.pkl) to .qtb
+    next to it. State and reward ids are taken from the filename.
+    """
+    state, reward = parse_state_reward(pkl_path)
+    if not state or not reward:
+        raise ValueError(f"Unable to parse state or reward from filename: {pkl_path}")
+    if out_path is None:
+        out_path = os.path.splitext(pkl_path)[0] + QTB_EXTENSION
+    if algorithm is None:
+        algorithm = 'SARSA' if 'sarsa' in os.path.basename(pkl_path) else 'Q-Learning'
+
+    with open(pkl_path, 'rb') as f:
+        q_table = pickle.load(f)
+    save_q_table_binary(out_path, q_table, state, reward, algorithm=algorithm)
+    return out_path
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Convert pickled Q-tables to the memory-mappable .qtb format.")
+    parser.add_argument('files', nargs='+', help="Pickled Q-table files (.pkl)")
+    args = parser.parse_args()
+
+    for pkl_path in args.files:
+        out_path = convert_pickle(pkl_path)
+        print(f"{pkl_path} -> {out_path}")
@@ -0,0 +1,246 @@
+# recording.py
+#
+# Compact episode recordings. An episode on a seeded Environment is fully
+# determined by its seed and its actions, so a recording is just
+#   (seed, initial direction, number of steps, actions packed 2 bits each)
+# i.e. about steps / 4 bytes, and replaying it through Environment
+# reconstructs every frame. The same recordings can be re-scored under a
+# different REWARD_SETTINGS entry without re-running any agent.
+#
+# File format (.rec, little-endian):
+#   magic b'SNAKEREC', uint32 version, uint32 count, then per episode
+#   uint64 seed, uint8 direction, uint32 steps, uint32 meta_len,
+#   meta JSON (meta_len bytes), packed actions (ceil(steps / 4) bytes)
+#
+# Usage:
+#   python recording.py record --qtable q_tables/q_table_S5_R1.pkl --episodes 100 --output s5_r1.rec
+#   python recording.py rescore s5_r1.rec --reward R3
+#   python recording.py replay s5_r1.rec --index 7          (headless check)
+#   python play_agent.py --replay s5_r1.rec --index 7       (pygame view)
+
+import argparse
+import json
+import numbers
+import random
+import struct
+import numpy as np
+from environment import Environment
+from settings import ACTIONS, REWARD_SETTINGS, STATE_SPACES, MAX_STEPS_PER_EPISODE
+
+MAGIC = b'SNAKEREC'
+VERSION = 1
+DIRECTION_CODES = ['UP', 'DOWN', 'LEFT', 'RIGHT']
+_EPISODE = struct.Struct('<QBII')
+
+
+def pack_actions(action_indices):
+    """Packs action indices (0..3) four to a byte, first action in the low bits."""
+    a = np.asarray(action_indices, dtype=np.uint8)
+    padded = np.zeros((len(a) + 3) // 4 * 4, dtype=np.uint8)
+    padded[:len(a)] = a
+    quads = padded.reshape(-1, 4)
+    return (quads[:, 0] | quads[:, 1] << 2 | quads[:, 2] << 4 | quads[:, 3] << 6).tobytes()
+
+
+def unpack_actions(data, steps):
+    """Inverse of pack_actions: the first `steps` action indices."""
+    packed = np.frombuffer(data, dtype=np.uint8)
+    quads = np.stack([packed & 3, packed >> 2 & 3, packed >> 4 & 3, packed >> 6 & 3], axis=1)
+    return quads.reshape(-1)[:steps]
+
+
+class EpisodeRecording:
+    __slots__ = ('seed', 'direction', 'steps', 'actions', 'meta')
+
+    def __init__(self, seed, direction, steps, actions, meta=None):
+        """
+        Args:
+            seed (int): Environment.reset seed.
+            direction (str): Initial snake direction.
+            steps (int): Number of actions.
+            actions (bytes): Action indices packed with pack_actions.
+            meta (dict): Free-form info, e.g. state/reward ids, score, length.
+        """
+        self.seed = seed
+        self.direction = direction
+        self.steps = steps
+        self.actions = actions
+        self.meta = meta or {}
+
+    def action_indices(self):
+        return unpack_actions(self.actions, self.steps)
+
+
+class EpisodeRecorder:
+    def __init__(self):
+        """Collects the actions of one episode at a time into recordings."""
+        self.recordings = []
+        self._seed = None
+        self._direction = None
+        self._actions = bytearray()
+
+    def begin(self, env, seed=None):
+        """
+        Resets `env` with `seed` (a fresh 64-bit seed from the global
+        `random` module if None) and starts recording.
+        """
+        if seed is None:
+            seed = random.getrandbits(64)
+        env.reset(seed)
+        self._seed = seed
+        self._direction = env.snake.direction
+        self._actions = bytearray()
+        return seed
+
+    def record(self, action):
+        """Records one action (name from ACTIONS or its index, e.g. from choose_actions)."""
+        self._actions.append(int(action) if isinstance(action, numbers.Integral) else ACTIONS.index(action))
+
+    def end(self, **meta):
+        """Finishes the episode; returns its EpisodeRecording."""
+        recording = EpisodeRecording(self._seed, self._direction, len(self._actions),
+                                     pack_actions(self._actions), meta)
+        self.recordings.append(recording)
+        return recording
+
+
+def save_recordings(path, recordings):
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<II', VERSION, len(recordings)))
+        for rec in recordings:
+            meta = json.dumps(rec.meta).encode('utf-8')
+            f.write(_EPISODE.pack(rec.seed, DIRECTION_CODES.index(rec.direction), rec.steps, len(meta)))
+            f.write(meta)
+            f.write(rec.actions)
+
+
+def load_recordings(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not an episode recording file")
+    version, count = struct.unpack_from('<II', data, len(MAGIC))
+    if version != VERSION:
+        raise ValueError(f"Unsupported recording version {version} in {path}")
+    offset = len(MAGIC) + 8
+    recordings = []
+    for _ in range(count):
+        seed, direction, steps, meta_len = _EPISODE.unpack_from(data, offset)
+        offset += _EPISODE.size
+        meta = json.loads(data[offset:offset + meta_len].decode('utf-8'))
+        offset += meta_len
+        num_bytes = (steps + 3) // 4
+        recordings.append(EpisodeRecording(seed, DIRECTION_CODES[direction], steps,
+                                           data[offset:offset + num_bytes], meta))
+        offset += num_bytes
+    return recordings
+
+
+# -----------------------------
+# Replay
+# -----------------------------
+def replay(recording, rewards, on_step=None):
+    """
+    Re-runs a recording through Environment.
+
+    Args:
+        recording (EpisodeRecording): Episode to replay.
+        rewards (dict): Reward settings to score it with (need not be the
+            ones it was recorded with; food spawns do not depend on them).
+        on_step: Optional callback on_step(env) after reset and every step,
+            e.g. for drawing.
+
+    Returns:
+        tuple: (total_reward, length, steps, done)
+    """
+    env = Environment(rewards, seed=recording.seed)
+    env.snake.direction = recording.direction
+    if on_step is not None:
+        on_step(env)
+    total_reward = 0
+    done = False
+    steps = 0
+    for index in recording.action_indices():
+        if done:
+            break
+        reward, done = env.step(ACTIONS[index])
+        total_reward += reward
+        steps += 1
+        if on_step is not None:
+            on_step(env)
+    return total_reward, env.snake.length, steps, done
+
+
+def rescore(recordings, rewards):
+    """(total_reward, length) of every recording under `rewards`."""
+    return [replay(rec, rewards)[:2] for rec in recordings]
+
+
+def record_agent(agent, rewards, episodes, max_steps=MAX_STEPS_PER_EPISODE, recorder=None):
+    """Plays `episodes` episodes with `agent` and records them."""
+    recorder = recorder or EpisodeRecorder()
+    env = Environment(rewards)
+    for _ in range(episodes):
+        recorder.begin(env)
+        state = agent.get_state(env.snake, env.food)
+        done = False
+        steps = 0
+        while not done and steps < max_steps:
+            action = agent.choose_action(state)
+            recorder.record(action)
+            _, done = env.step(action)
+            state = agent.get_state(env.snake, env.food)
+            steps += 1
+        recorder.end(score=env.score, length=env.snake.length)
+    return recorder.recordings
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Record, replay and re-score Snake episodes.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    p = sub.add_parser('record', help="Record episodes of a trained agent")
+    p.add_argument('--qtable', required=True, help="Q-table file (.pkl or .qtb)")
+    p.add_argument('--agent_type', default='Q', help="'Q' or 'SARSA'")
+    p.add_argument('--episodes', type=int, default=10)
+    p.add_argument('--seed', type=int, default=None, help="Seed for the episode seeds")
+    p.add_argument('--output', required=True)
+    p = sub.add_parser('rescore', help="Score recordings under another reward setting")
+    p.add_argument('file')
+    p.add_argument('--reward', required=True, choices=list(REWARD_SETTINGS))
+    p = sub.add_parser('replay', help="Replay one recording headless and check it")
+    p.add_argument('file')
+    p.add_argument('--index', type=int, default=0)
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        from agent import Agent
+        from sarsa_agent import SarsaAgent
+        from qtable_io import parse_state_reward
+        state_name, reward_name = parse_state_reward(args.qtable)
+        if not state_name:
+            raise ValueError(f"Unable to parse state or reward from filename: {args.qtable}")
+        agent_class = SarsaAgent if args.agent_type.upper() == 'SARSA' else Agent
+        agent = agent_class(state_space=STATE_SPACES[state_name], exploration_rate=0.0)
+        agent.load_q_table(args.qtable)
+        if args.seed is not None:
+            random.seed(args.seed)
+        recordings = record_agent(agent, REWARD_SETTINGS[reward_name], args.episodes)
+        for rec in recordings:
+            rec.meta.update(state=state_name, reward=reward_name)
+        save_recordings(args.output, recordings)
+        total = sum(rec.steps for rec in recordings)
+        print(f"{len(recordings)} episodes ({total} steps) saved to {args.output}")
+    elif args.command == 'rescore':
+        recordings = load_recordings(args.file)
+        scores = rescore(recordings, REWARD_SETTINGS[args.reward])
+        for i, (total_reward, length) in enumerate(scores):
+            print(f"{i}: reward {total_reward:.1f}, length {length}")
+        print(f"Mean reward under {args.reward}: {np.mean([s[0] for s in scores]):.2f}")
+    else:
+        rec = load_recordings(args.file)[args.index]
+        total_reward, length, steps, done = replay(rec, REWARD_SETTINGS[rec.meta.get('reward', 'R1')])
+        print(f"Episode {args.index}: {steps} steps, reward {total_reward:.1f}, length {length}")
+        if rec.meta.get('length', length) != length or rec.meta.get('score', total_reward) != total_reward:
+            raise SystemExit(f"Replay diverged from the recorded score {rec.meta.get('score')} "
+                             f"and length {rec.meta.get('length')}")
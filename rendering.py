@@ -0,0 +1,148 @@
+# rendering.py
+#
+# Pygame drawing for the headless simulation in environment.py.
+# Grid cells are converted to pixels here and nowhere else.
+
+import pygame
+from settings import TILE_SIZE, GRID_WIDTH, GRID_HEIGHT, COLORS
+
+
+def cell_rect(x, y):
+    """Pixel rectangle covering grid cell (x, y)."""
+    return pygame.Rect(x * TILE_SIZE, y * TILE_SIZE, TILE_SIZE, TILE_SIZE)
+
+
+def draw_grid(surface):
+    for x in range(0, GRID_WIDTH * TILE_SIZE, TILE_SIZE):
+        pygame.draw.line(surface, COLORS['light_gray'], (x, 0), (x, GRID_HEIGHT * TILE_SIZE))
+    for y in range(0, GRID_HEIGHT * TILE_SIZE, TILE_SIZE):
+        pygame.draw.line(surface, COLORS['light_gray'], (0, y), (GRID_WIDTH * TILE_SIZE, y))
+
+
+def draw_snake(surface, snake):
+    for i, (x, y) in enumerate(snake.body):
+        color = COLORS['dark_green'] if i == 0 else COLORS['green']
+        pygame.draw.rect(surface, color, cell_rect(x, y), border_radius=5)
+
+
+def draw_food(surface, food):
+    x, y = food.position
+    pygame.draw.rect(surface, COLORS['red'], cell_rect(x, y), border_radius=5)
+
+
+def draw_environment(surface, font, env, episode):
+    surface.fill(COLORS['black'])
+    draw_grid(surface)
+    draw_snake(surface, env.snake)
+    draw_food(surface, env.food)
+
+    text = f"Score: {env.score:.1f} | Episode: {episode}"
+    text_surface = font.render(text, True, COLORS['white'])
+    surface.blit(text_surface, (10, 10))
+
+
+# -----------------------------
+# Incremental rendering
+# -----------------------------
+def _sprite(color):
+    sprite = pygame.Surface((TILE_SIZE, TILE_SIZE), pygame.SRCALPHA)
+    pygame.draw.rect(sprite, color, sprite.get_rect(), border_radius=5)
+    return sprite
+
+
+class IncrementalRenderer:
+    def __init__(self, surface, font):
+        """
+        Draws the same picture as draw_environment, but only repaints what
+        changed since the previous frame: the old and new head, the vacated
+        tail cell, the old and new food cell and the score text (re-rendered
+        only when its text changes). The grid background and the
+        segment/food sprites are drawn once and blitted, so the cost per frame
+        does not depend on the snake's length.
+
+        Call draw(env, episode) once per frame; it updates the display itself
+        with pygame.display.update(rects).
+        """
+        self.surface = surface
+        self.font = font
+        self.background = pygame.Surface(surface.get_size())
+        self.background.fill(COLORS['black'])
+        draw_grid(self.background)
+        self.head_sprite = _sprite(COLORS['dark_green'])
+        self.body_sprite = _sprite(COLORS['green'])
+        self.food_sprite = _sprite(COLORS['red'])
+
+        self._snake = None
+        self._head = None
+        self._tail = None
+        self._food = None
+        self._text = None
+        self._text_surface = None
+        self._text_rect = pygame.Rect(10, 10, 0, 0)
+
+    def _draw_cell(self, env, cell):
+        """Repaints one grid cell from scratch; returns its rect."""
+        x, y = cell
+        if not (0 <= x < GRID_WIDTH and 0 <= y < GRID_HEIGHT):
+            return None
+        rect = cell_rect(x, y)
+        self.surface.blit(self.background, rect, rect)
+        snake = env.snake
+        if snake.head == cell:
+            self.surface.blit(self.head_sprite, rect)
+        elif snake.occupies(x, y):
+            self.surface.blit(self.body_sprite, rect)
+        if env.food.position == cell:
+            self.surface.blit(self.food_sprite, rect)
+        return rect
+
+    def _cells_under(self, rect):
+        x0, y0 = rect.left // TILE_SIZE, rect.top // TILE_SIZE
+        x1, y1 = (rect.right - 1) // TILE_SIZE, (rect.bottom - 1) // TILE_SIZE
+        return [(x, y) for y in range(y0, y1 + 1) for x in range(x0, x1 + 1)]
+
+    def full_redraw(self, env, episode):
+        """Repaints everything (first frame, after a reset or a window change)."""
+        self.surface.blit(self.background, (0, 0))
+        draw_snake(self.surface, env.snake)
+        draw_food(self.surface, env.food)
+        self._remember(env)
+        self._draw_text(env, episode, force=True)
+        pygame.display.update()
+
+    def _remember(self, env):
+        self._snake = env.snake
+        self._head = env.snake.head
+        self._tail = env.snake.tail
+        self._food = env.food.position
+
+    def _draw_text(self, env, episode, force=False):
+        """Re-blits the score text if it changed (or `force`); returns dirty rects."""
+        text = f"Score: {env.score:.1f} | Episode: {episode}"
+        if text == self._text and not force:
+            return []
+        old_rect = self._text_rect
+        if text != self._text:
+            self._text = text
+            self._text_surface = self.font.render(text, True, COLORS['white'])
+        self._text_rect = self._text_surface.get_rect(topleft=(10, 10))
+        area = old_rect.union(self._text_rect)
+        for cell in self._cells_under(area):
+            self._draw_cell(env, cell)
+        self.surface.blit(self._text_surface, self._text_rect)
+        return [area]
+
+    def draw(self, env, episode):
+        if env.snake is not self._snake:
+            self.full_redraw(env, episode)
+            return
+
+        dirty_cells = {self._head, env.snake.head, self._tail, env.snake.tail,
+                       self._food, env.food.position}
+        rects = [r for r in (self._draw_cell(env, cell) for cell in dirty_cells) if r]
+        self._remember(env)
+
+        # Cells repainted under the text would hide it, so redraw it too
+        covered = any(r.colliderect(self._text_rect) for r in rects)
+        rects.extend(self._draw_text(env, episode, force=covered))
+        pygame.display.update(rects)
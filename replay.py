@@ -0,0 +1,174 @@
+# replay.py
+#
+# Experience replay for dense Q-tables. Transitions are stored in
+# preallocated NumPy columns used as a ring (state index, action index,
+# reward, next state index, done), so adding one allocates no Python
+# objects, and minibatches go straight to Agent.learn_batch.
+#
+# Prioritized sampling (Schaul et al.) keeps |TD error|^alpha per slot in a
+# sum tree, sampled and updated with vectorized operations over the tree
+# levels; importance-sampling weights (N * P(i))^-beta / max scale each
+# sample's learning rate.
+
+import numpy as np
+from settings import REPLAY_CAPACITY, REPLAY_BATCH_SIZE
+
+
+class ReplayBuffer:
+    def __init__(self, capacity=REPLAY_CAPACITY, prioritized=False, alpha=0.6, beta=0.4,
+                 epsilon=1e-3, seed=None):
+        """
+        Args:
+            capacity (int): Transitions kept; the oldest are overwritten.
+            prioritized (bool): Sample proportionally to |TD error|^alpha
+                instead of uniformly.
+            alpha (float): Priority exponent (0 = uniform).
+            beta (float): Importance-sampling exponent (1 = full correction).
+            epsilon (float): Added to |TD error| so no transition starves.
+            seed (int): Sampling seed; by default drawn from np.random, so
+                np.random.seed makes runs reproducible.
+        """
+        self.capacity = capacity
+        self.prioritized = prioritized
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon
+        if seed is None:
+            seed = np.random.randint(2**31)
+        self.rng = np.random.default_rng(seed)
+
+        self.states = np.zeros(capacity, dtype=np.int64)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int64)
+        self.dones = np.zeros(capacity, dtype=bool)
+        self.position = 0
+        self.size = 0
+
+        if prioritized:
+            # Sum tree over a power-of-two number of leaves; node i has
+            # children 2i and 2i + 1, leaves start at self._leaves.
+            self._leaves = 1 << max(0, (capacity - 1).bit_length())
+            self.tree = np.zeros(2 * self._leaves, dtype=np.float64)
+            self.max_priority = 1.0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, state, action, reward, next_state, done):
+        """Stores one transition (state indices and action index as ints)."""
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.position = (i + 1) % self.capacity
+        if self.size < self.capacity:
+            self.size += 1
+        if self.prioritized:
+            # Walk up from the leaf with Python floats; cheaper than the
+            # vectorized path for a single slot
+            tree = self.tree
+            node = self._leaves + i
+            tree[node] = self.max_priority
+            node >>= 1
+            while node:
+                tree[node] = tree[2 * node] + tree[2 * node + 1]
+                node >>= 1
+
+    def add_batch(self, states, actions, rewards, next_states, dones):
+        """Stores many transitions at once (e.g. one step of a VecEnvironment)."""
+        n = len(states)
+        slots = (self.position + np.arange(n)) % self.capacity
+        self.states[slots] = states
+        self.actions[slots] = actions
+        self.rewards[slots] = rewards
+        self.next_states[slots] = next_states
+        self.dones[slots] = dones
+        self.position = int((self.position + n) % self.capacity)
+        self.size = min(self.size + n, self.capacity)
+        if self.prioritized:
+            self._set_priorities(slots, np.full(n, self.max_priority))
+
+    # -----------------------------
+    # Sampling
+    # -----------------------------
+    def sample(self, batch_size=REPLAY_BATCH_SIZE):
+        """
+        Returns:
+            tuple: (indices, states, actions, rewards, next_states, dones, weights);
+            weights is None for uniform sampling.
+        """
+        if self.prioritized:
+            indices = self._sample_tree(batch_size)
+            probabilities = self.tree[self._leaves + indices] / self.tree[1]
+            weights = (self.size * probabilities) ** -self.beta
+            weights /= weights.max()
+        else:
+            indices = self.rng.integers(0, self.size, size=batch_size)
+            weights = None
+        return (indices, self.states[indices], self.actions[indices], self.rewards[indices],
+                self.next_states[indices], self.dones[indices], weights)
+
+    def update_priorities(self, indices, td_errors):
+        """Sets the priorities of sampled transitions from their new TD errors."""
+        if not self.prioritized:
+            return
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+        self._set_priorities(indices, priorities)
+
+    def _set_priorities(self, indices, priorities):
+        # Duplicate nodes just write the same sum twice
+        nodes = self._leaves + np.asarray(indices)
+        self.tree[nodes] = priorities
+        for _ in range(self._leaves.bit_length() - 1):
+            nodes = nodes >> 1
+            self.tree[nodes] = self.tree[2 * nodes] + self.tree[2 * nodes + 1]
+
+    def _sample_tree(self, batch_size):
+        # One stratified draw per segment of the total priority mass
+        total = self.tree[1]
+        targets = (np.arange(batch_size) + self.rng.random(batch_size)) * (total / batch_size)
+        nodes = np.ones(batch_size, dtype=np.int64)
+        while nodes[0] < self._leaves:
+            left = 2 * nodes
+            go_right = targets >= self.tree[left]
+            targets = np.where(go_right, targets - self.tree[left], targets)
+            nodes = left + go_right
+        return np.minimum(nodes - self._leaves, self.size - 1)
+
+    # -----------------------------
+    # Checkpointing
+    # -----------------------------
+    def state_dict(self):
+        """Copy of the buffer contents and RNG state (see checkpoint.py)."""
+        state = {name: getattr(self, name).copy()
+                 for name in ('states', 'actions', 'rewards', 'next_states', 'dones')}
+        state.update(position=self.position, size=self.size,
+                     rng_state=self.rng.bit_generator.state)
+        if self.prioritized:
+            state.update(tree=self.tree.copy(), max_priority=self.max_priority)
+        return state
+
+    def load_state_dict(self, state):
+        for name in ('states', 'actions', 'rewards', 'next_states', 'dones'):
+            getattr(self, name)[:] = state[name]
+        self.position = state['position']
+        self.size = state['size']
+        self.rng.bit_generator.state = state['rng_state']
+        if self.prioritized:
+            self.tree[:] = state['tree']
+            self.max_priority = state['max_priority']
+
+
+def replay_update(agent, buffer, batch_size=REPLAY_BATCH_SIZE):
+    """
+    Samples a minibatch from `buffer`, applies it with agent.learn_batch and
+    feeds the TD errors back as priorities.
+    """
+    indices, states, actions, rewards, next_states, dones, weights = buffer.sample(batch_size)
+    td_errors = agent.learn_batch(states, actions, rewards, next_states, dones, weights)
+    buffer.update_priorities(indices, td_errors)
+    return td_errors
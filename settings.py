@@ -155,6 +155,16 @@ EXPLORATION_RATE = 1.0
 EXPLORATION_DECAY = 0.995
 MIN_EXPLORATION_RATE = 0.01
 
+# Eligibility traces (QLambdaAgent, SarsaLambdaAgent)
+TRACE_DECAY = 0.8      # lambda
+TRACE_CUTOFF = 0.01    # traces that decay below this are dropped
+
+# Experience replay (replay.py)
+REPLAY_CAPACITY = 50000
+REPLAY_BATCH_SIZE = 32
+REPLAY_START = 1000    # transitions stored before minibatches are replayed
+REPLAY_MAX_DENSE_ROWS = 1_000_000  # largest dense table replay may allocate (~13 MB)
+
 # --------------------------------
 # MISCELLANEOUS
 # --------------------------------
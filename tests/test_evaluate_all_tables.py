@@ -0,0 +1,66 @@
+# tests/test_evaluate_all_tables.py
+
+import os
+import random
+import numpy as np
+import pandas as pd
+from agent import Agent
+from sarsa_agent import SarsaAgent
+from environment import Environment
+from settings import STATE_SPACES, REWARD_SETTINGS
+import evaluate_all_tables as evaluation
+
+
+def _save_trained(agent, path, steps=400):
+    env = Environment(REWARD_SETTINGS["R1"], seed=0)
+    state = agent.get_state(env.snake, env.food)
+    for _ in range(steps):
+        action = agent.choose_action(state)
+        reward, done = env.step(action)
+        next_state = agent.get_state(env.snake, env.food)
+        agent.learn(state, action, reward, next_state, done)
+        state = next_state
+        if done:
+            env.reset()
+            state = agent.get_state(env.snake, env.food)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    agent.save_q_table(path)
+
+
+def _make_tables():
+    random.seed(0)
+    np.random.seed(0)
+    # Few training steps, so evaluation meets many unseen states
+    _save_trained(Agent(STATE_SPACES["S1"]), "q_tables/q_table_S1_R1.pkl", steps=15)
+    _save_trained(Agent(STATE_SPACES["S5"], dense=True), "q_tables/q_table_S5_R1.pkl")
+
+
+def test_parallel_matches_serial(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _make_tables()
+    serial = evaluation.evaluate_all_tables(num_episodes=12, max_steps=200, workers=1, shards=4, seed=3)
+    parallel = evaluation.evaluate_all_tables(num_episodes=12, max_steps=200, workers=2, shards=4, seed=3)
+    pd.testing.assert_frame_equal(serial.reset_index(drop=True), parallel.reset_index(drop=True))
+
+
+def test_shard_result_does_not_depend_on_earlier_shards(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _make_tables()
+    monkeypatch.setattr(evaluation, "_loaded_agents", {})
+    args = ("q_tables/q_table_S1_R1.pkl", "Q-Learning", "S1", "R1", 20, 200)
+    first = evaluation.evaluate_shard(*args, 11)
+    evaluation.evaluate_shard(*args, 12)
+    again = evaluation.evaluate_shard(*args, 11)
+    for field in ("best", "worst", "total_length", "steps"):
+        assert first[field] == again[field]
+
+
+def test_run_episodes_leaves_table_unchanged(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _make_tables()
+    agent = SarsaAgent(STATE_SPACES["S1"], exploration_rate=0.0)
+    agent.load_q_table("q_tables/q_table_S1_R1.pkl")
+    size = len(agent.q_table)
+    random.seed(1)
+    evaluation.run_episodes(agent, REWARD_SETTINGS["R1"], 5, 200)
+    assert len(agent.q_table) == size
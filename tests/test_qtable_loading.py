@@ -0,0 +1,57 @@
+# tests/test_qtable_loading.py
+
+import random
+import numpy as np
+import pytest
+from agent import Agent
+from sarsa_agent import SarsaAgent
+from environment import Environment
+from qtable import DenseQTable
+from qtable_io import convert_pickle
+from settings import STATE_SPACES, REWARD_SETTINGS
+
+
+def _train_dense(agent_class, steps=300):
+    random.seed(0)
+    np.random.seed(0)
+    agent = agent_class(state_space=STATE_SPACES["S5"], dense=True)
+    env = Environment(REWARD_SETTINGS["R1"], seed=0)
+    state = agent.get_state(env.snake, env.food)
+    for _ in range(steps):
+        action = agent.choose_action(state)
+        reward, done = env.step(action)
+        next_state = agent.get_state(env.snake, env.food)
+        if agent_class is Agent:
+            agent.learn(state, action, reward, next_state, done)
+        elif done:
+            agent.sarsa_update_terminal(state, action, reward)
+        else:
+            agent.sarsa_update(state, action, reward, next_state, agent.choose_action(next_state))
+        state = next_state
+        if done:
+            env.reset()
+            state = agent.get_state(env.snake, env.food)
+    return agent
+
+
+@pytest.mark.parametrize("agent_class", [Agent, SarsaAgent])
+@pytest.mark.parametrize("extension", [".pkl", ".qtb"])
+def test_default_agent_loads_dense_table(tmp_path, agent_class, extension):
+    trained = _train_dense(agent_class)
+    path = str(tmp_path / "q_table_S5_R1.pkl")
+    trained.save_q_table(path)
+    if extension == ".qtb":
+        path = convert_pickle(path)
+
+    loaded = agent_class(state_space=STATE_SPACES["S5"], exploration_rate=0.0)
+    loaded.load_q_table(path)
+
+    assert isinstance(loaded.q_table, DenseQTable)
+    np.testing.assert_array_equal(loaded.q_table.values, trained.q_table.values)
+    env = Environment(REWARD_SETTINGS["R1"], seed=1)
+    for _ in range(50):
+        state = loaded.get_state(env.snake, env.food)
+        assert state == trained.get_state(env.snake, env.food)
+        action = loaded.choose_action(state)
+        if env.step(action)[1]:
+            env.reset()
@@ -0,0 +1,114 @@
+# watch.py
+#
+# Watch a training run without throttling it. The training loop calls
+# Watcher.observe(env, episode) every step; the board is sent to a separate
+# renderer process at most FPS times per second, so the simulation keeps
+# running at full speed and only the frames in between are skipped.
+#
+# In the pygame window:
+#   SPACE  toggle real time (the simulation is slowed to FPS steps/second
+#          and every step is shown) / full speed (the default)
+#   close  stop watching; training continues unthrottled
+
+import multiprocessing
+import time
+from types import SimpleNamespace
+from settings import FPS, SCREEN_WIDTH, SCREEN_HEIGHT, FONT_NAME, FONT_SIZE
+
+
+def _render_loop(conn, realtime, closed, fps):
+    """Renderer process: draws the latest snapshot at `fps`."""
+    import pygame
+    from rendering import draw_environment
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREEN_WIDTH, SCREEN_HEIGHT))
+    font = pygame.font.SysFont(FONT_NAME, FONT_SIZE)
+    clock = pygame.time.Clock()
+    last_steps, last_time = 0, time.perf_counter()
+
+    while True:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                closed.value = 1
+                pygame.quit()
+                return
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                realtime.value = 0 if realtime.value else 1
+
+        snapshot = None
+        while conn.poll():
+            snapshot = conn.recv()
+            if snapshot is None:
+                pygame.quit()
+                return
+        if snapshot is not None:
+            body, food, score, episode, steps = snapshot
+            view = SimpleNamespace(snake=SimpleNamespace(body=body),
+                                   food=SimpleNamespace(position=food), score=score)
+            draw_environment(screen, font, view, episode)
+            pygame.display.update()
+
+            now = time.perf_counter()
+            if now - last_time >= 1.0:
+                mode = "real time" if realtime.value else "full speed"
+                rate = (steps - last_steps) / (now - last_time)
+                pygame.display.set_caption(f"Watching ({mode}, SPACE to toggle) - {rate:,.0f} steps/s")
+                last_steps, last_time = steps, now
+        clock.tick(fps)
+
+
+class Watcher:
+    def __init__(self, fps=FPS, realtime=False):
+        """
+        Args:
+            fps (int): Frames per second shown (and steps per second in
+                real-time mode).
+            realtime (bool): Start slowed down to real time.
+        """
+        self.fps = fps
+        ctx = multiprocessing.get_context('spawn')
+        self._realtime = ctx.RawValue('b', 1 if realtime else 0)
+        self._closed = ctx.RawValue('b', 0)
+        child_conn, self._conn = ctx.Pipe(duplex=False)
+        self._process = ctx.Process(target=_render_loop, daemon=True,
+                                    args=(child_conn, self._realtime, self._closed, fps))
+        self._process.start()
+        self._interval = 1.0 / fps
+        self._next_frame = 0.0
+        self._steps = 0
+        self.active = True
+
+    def observe(self, env, episode):
+        """
+        Called once per simulation step. Sends a snapshot when a frame is
+        due; in real-time mode it also sleeps until then.
+        """
+        if not self.active:
+            return
+        self._steps += 1
+        now = time.perf_counter()
+        if self._realtime.value:
+            if now < self._next_frame:
+                time.sleep(self._next_frame - now)
+                now = self._next_frame
+        elif now < self._next_frame:
+            return
+        if self._closed.value:
+            self.active = False
+            return
+        self._next_frame = now + self._interval
+        try:
+            self._conn.send((list(env.snake.body), env.food.position, env.score, episode, self._steps))
+        except (BrokenPipeError, OSError):
+            # The renderer died (display error, killed); keep training
+            self.active = False
+
+    def close(self):
+        if self._process.is_alive():
+            try:
+                self._conn.send(None)
+            except (BrokenPipeError, OSError):
+                pass
+            self._process.join(timeout=5)
+        self.active = False